@@ -1,8 +1,19 @@
 # app/ml/upload_artifacts.py
-# Script to upload trained model artifacts to a Supabase storage bucket.
+# Script to publish trained model artifacts to a Supabase storage bucket.
+# Artifacts are gzip-compressed and stored content-addressed under
+# blobs/<sha256>.gz, so unchanged files are never re-uploaded.
+# A per-version manifest (model_<VERSION>/manifest.json) records the
+# checksum and sizes of every file and is what the API reads first.
 
 import os
+import gzip
+import json
+import shutil
+import hashlib
 import pathlib
+import tempfile
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from supabase import create_client
 
@@ -13,6 +24,11 @@ SUPABASE_KEY  = os.environ["SUPABASE_SERVICE_KEY"]
 BUCKET        = os.getenv("SUPABASE_STORAGE_BUCKET", "artifacts")
 VERSION       = os.getenv("MODEL_VERSION", "v1")
 ART_DIR       = pathlib.Path("artifacts_local") / f"model_{VERSION}"
+UPLOAD_WORKERS = int(os.getenv("ARTIFACT_UPLOAD_WORKERS", "4"))
+
+ART_FILES     = ("model.joblib", "vectorizer.joblib")
+BLOB_PREFIX   = "blobs"
+CHUNK_SIZE    = 1024 * 1024  # stream files in 1 MiB chunks
 
 client = create_client(SUPABASE_URL, SUPABASE_KEY)
 
@@ -25,32 +41,106 @@ def ensure_bucket(bucket: str):
         # Ignore if the bucket already exists
         pass
 
-def upload_file(local_path: pathlib.Path, dest_path: str):
-    """Upload a file to Supabase storage."""
-    data = local_path.read_bytes()
+def file_sha256(path: pathlib.Path) -> str:
+    """Hash a file in fixed-size chunks without loading it into memory."""
+    h = hashlib.sha256()
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def existing_blobs(bucket: str) -> dict:
+    """Return {blob name: stored size} for blobs already in the bucket."""
+    found = {}
+    offset = 0
+    while True:
+        items = client.storage.from_(bucket).list(
+            BLOB_PREFIX, {"limit": 1000, "offset": offset}
+        ) or []
+        for it in items:
+            size = (it.get("metadata") or {}).get("size")
+            found[it["name"]] = int(size) if size is not None else None
+        if len(items) < 1000:
+            return found
+        offset += len(items)
+
+def upload_blob(local_path: pathlib.Path, dest_path: str) -> int:
+    """
+    Gzip a file into a temporary file and upload it.
+    Returns the compressed size in bytes.
+    """
+    with tempfile.NamedTemporaryFile(suffix=".gz", delete=False) as tmp:
+        tmp_path = pathlib.Path(tmp.name)
+    try:
+        with local_path.open("rb") as src, gzip.open(tmp_path, "wb", compresslevel=6) as dst:
+            shutil.copyfileobj(src, dst, CHUNK_SIZE)
+        file_options = {
+            "contentType": "application/gzip",
+            # Blob names are content hashes, so they never change
+            "cacheControl": "31536000",
+            "upsert": "true",
+        }
+        client.storage.from_(BUCKET).upload(dest_path, tmp_path, file_options)
+        size = tmp_path.stat().st_size
+    finally:
+        tmp_path.unlink(missing_ok=True)
+    print("Uploaded:", dest_path)
+    return size
+
+def publish_file(name: str, known: dict) -> dict:
+    """Hash one artifact, upload it if its blob is missing, and describe it."""
+    path = ART_DIR / name
+    digest = file_sha256(path)
+    blob_name = f"{digest}.gz"
+    blob_path = f"{BLOB_PREFIX}/{blob_name}"
+
+    if blob_name in known:
+        print("Unchanged, skipping:", name)
+        compressed_size = known[blob_name]
+    else:
+        compressed_size = upload_blob(path, blob_path)
+
+    return {
+        "sha256": digest,
+        "size": path.stat().st_size,
+        "compressed_size": compressed_size,
+        "blob": blob_path,
+    }
+
+def upload_manifest(files: dict):
+    """Write the version manifest that the API fetches before downloading."""
+    manifest = {
+        "version": VERSION,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "compression": "gzip",
+        "files": files,
+    }
+    data = json.dumps(manifest, indent=2, sort_keys=True).encode("utf-8")
     file_options = {
-        "contentType": "application/octet-stream",
-        "cacheControl": "3600",
+        "contentType": "application/json",
+        "cacheControl": "no-cache",
         "upsert": "true",
     }
-    client.storage.from_(BUCKET).upload(dest_path, data, file_options)
-    print("Uploaded:", dest_path)
+    dest = f"model_{VERSION}/manifest.json"
+    client.storage.from_(BUCKET).upload(dest, data, file_options)
+    print("Uploaded:", dest)
 
 def main():
-    """Check for artifacts and upload them to the configured bucket."""
+    """Check for artifacts and publish them to the configured bucket."""
     if not ART_DIR.exists():
         raise SystemExit(f"Artifacts directory not found: {ART_DIR}")
 
-    m = ART_DIR / "model.joblib"
-    v = ART_DIR / "vectorizer.joblib"
-    if not m.exists() or not v.exists():
-        raise SystemExit(f"Missing artifacts in {ART_DIR}")
+    missing = [n for n in ART_FILES if not (ART_DIR / n).exists()]
+    if missing:
+        raise SystemExit(f"Missing artifacts in {ART_DIR}: {missing}")
 
     ensure_bucket(BUCKET)
+    known = existing_blobs(BUCKET)
+
+    with ThreadPoolExecutor(max_workers=max(1, UPLOAD_WORKERS)) as pool:
+        results = list(pool.map(lambda n: publish_file(n, known), ART_FILES))
 
-    base = f"model_{VERSION}"
-    upload_file(m, f"{base}/model.joblib")
-    upload_file(v, f"{base}/vectorizer.joblib")
+    upload_manifest(dict(zip(ART_FILES, results)))
     print("Upload complete")
 
 if __name__ == "__main__":
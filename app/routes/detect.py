@@ -7,12 +7,21 @@ from fastapi import APIRouter
 from pydantic import BaseModel
 from app.services.storage import load_artifacts
 from app.services.rules import eval_rules
-import numpy as np
+from app.services.profiling import ProfiledRoute
+from app.services.timing import phase
+import os
+import math
+import threading
 
-router = APIRouter(prefix="/detect", tags=["detect"])
+router = APIRouter(prefix="/detect", tags=["detect"], route_class=ProfiledRoute)
 
-# Load the trained model and vectorizer from storage
-MODEL, VECT = load_artifacts()
+# Load artifacts in the background at startup instead of on the first request
+DETECT_PRELOAD = os.getenv("DETECT_PRELOAD", "0") == "1"
+
+def preload():
+    """Start loading the model in a background thread when DETECT_PRELOAD=1."""
+    if DETECT_PRELOAD:
+        threading.Thread(target=load_artifacts, name="detect-preload", daemon=True).start()
 
 class DetectIn(BaseModel):
     """Request body schema for the detection endpoint."""
@@ -35,19 +44,23 @@ def detect(inp: DetectIn):
             "reasons": ["No text provided."]
         }
 
-    # Generate ML score
-    X = VECT.transform([t])
-    if hasattr(MODEL, "predict_proba"):
-        score_ml = float(MODEL.predict_proba(X)[0, 1])
-    elif hasattr(MODEL, "decision_function"):
-        raw = float(MODEL.decision_function(X)[0])
-        score_ml = 1 / (1 + np.exp(-raw))
-    else:
-        # Fallback to binary prediction
-        score_ml = float(MODEL.predict(X)[0])
+    # Generate ML score (model and vectorizer are loaded on first use)
+    with phase("model"):
+        model, vect = load_artifacts()
+        X = vect.transform([t])
+        if hasattr(model, "predict_proba"):
+            score_ml = float(model.predict_proba(X)[0, 1])
+        elif hasattr(model, "decision_function"):
+            # Clamped so math.exp cannot overflow
+            raw = max(-500.0, min(500.0, float(model.decision_function(X)[0])))
+            score_ml = 1 / (1 + math.exp(-raw))
+        else:
+            # Fallback to binary prediction
+            score_ml = float(model.predict(X)[0])
 
     # Apply rule-based evaluation
-    rule_score, hits, reasons = eval_rules(t)
+    with phase("rules"):
+        rule_score, hits, reasons = eval_rules(t)
 
     # Combine results with threshold policy (precision-first)
     if (score_ml >= 0.80) and (rule_score >= 3):
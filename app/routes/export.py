@@ -0,0 +1,210 @@
+# app/routes/export.py
+# Streaming export of scam_stats slices for offline analysis.
+# Rows are read through a server-side (named) cursor in fixed-size batches
+# and streamed as chunked CSV, NDJSON or Arrow IPC, so memory stays flat
+# regardless of how large the requested slice is.
+# The query runs and its first batch is fetched before the response starts,
+# so query errors and timeouts return a proper error status.
+
+import os
+import io
+import csv
+import json
+from contextlib import ExitStack
+from typing import Optional, List, Any, Iterator, Tuple
+from psycopg2 import OperationalError
+from psycopg2.pool import PoolError
+from fastapi import APIRouter, Query, HTTPException
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from app.services.db import get_conn
+from app.services.profiling import ProfiledRoute
+from app.services.filters import (
+    DIMENSIONS, map_state, map_category, map_scam_type,
+    map_contact_method, map_age_group, map_gender, make_where,
+)
+
+router = APIRouter(prefix="/stats", tags=["export"], route_class=ProfiledRoute)
+
+EXPORT_BATCH_ROWS = int(os.getenv("EXPORT_BATCH_ROWS", "5000"))
+# The first FETCH of a grouped slice runs the whole aggregate, so exports
+# are not bound by DB_STATEMENT_TIMEOUT_MS (0 disables the timeout)
+EXPORT_STATEMENT_TIMEOUT_MS = int(os.getenv("EXPORT_STATEMENT_TIMEOUT_MS", "0"))
+
+_MEDIA_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+def _parse_grain(grain: Optional[str]) -> List[str]:
+    """Validate a comma-separated grain against the scam_stats dimensions."""
+    if not grain:
+        return list(DIMENSIONS)
+    dims = [d.strip().lower() for d in grain.split(",") if d.strip()]
+    unknown = [d for d in dims if d not in DIMENSIONS]
+    if unknown or not dims:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid grain {unknown or grain!r}; choose from {list(DIMENSIONS)}",
+        )
+    # Keep canonical order and drop duplicates
+    return [d for d in DIMENSIONS if d in dims]
+
+def _open_batches(sql: str, params: List[Any]) -> Tuple[Iterator[list], ExitStack]:
+    """
+    Run the query on a server-side cursor and fetch its first batch.
+    Returns an iterator over all batches and the stack holding the
+    connection (closed when the iterator is exhausted, or explicitly).
+    """
+    stack = ExitStack()
+    try:
+        conn = stack.enter_context(
+            get_conn(statement_timeout_ms=EXPORT_STATEMENT_TIMEOUT_MS, readonly=True)
+        )
+        cur = stack.enter_context(conn.cursor(name="scam_stats_export"))
+        cur.itersize = EXPORT_BATCH_ROWS
+        cur.execute(sql, params)
+        first = cur.fetchmany(EXPORT_BATCH_ROWS)
+    except (OperationalError, PoolError):
+        stack.close()
+        raise HTTPException(status_code=503, detail="Export query failed or timed out; try a narrower slice.")
+    except BaseException:
+        stack.close()
+        raise
+    return _iter_batches(stack, cur, first), stack
+
+def _iter_batches(stack: ExitStack, cur, rows: list) -> Iterator[list]:
+    """Yield the prefetched batch, then the rest, releasing the connection at the end."""
+    with stack:
+        while rows:
+            yield rows
+            rows = cur.fetchmany(EXPORT_BATCH_ROWS)
+
+def _stream_csv(columns: List[str], batches: Iterator[list]) -> Iterator[bytes]:
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(columns)
+    yield buf.getvalue().encode("utf-8")
+    for rows in batches:
+        buf.seek(0); buf.truncate()
+        writer.writerows(rows)
+        yield buf.getvalue().encode("utf-8")
+
+def _stream_ndjson(columns: List[str], batches: Iterator[list]) -> Iterator[bytes]:
+    for rows in batches:
+        yield "".join(
+            json.dumps(dict(zip(columns, row))) + "\n" for row in rows
+        ).encode("utf-8")
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object that collects bytes until they are drained."""
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._chunks.append(bytes(b))
+        return len(b)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+def _stream_arrow(columns: List[str], batches: Iterator[list]) -> Iterator[bytes]:
+    import pyarrow as pa
+
+    types = {"year": pa.int32(), "month": pa.int32(),
+             "reports": pa.int64(), "losses": pa.float64()}
+    schema = pa.schema([(c, types.get(c, pa.string())) for c in columns])
+
+    sink = _ChunkSink()
+    writer = pa.ipc.new_stream(sink, schema)
+    yield sink.drain()
+    for rows in batches:
+        arrays = [
+            pa.array([r[i] for r in rows], type=schema.field(i).type)
+            for i in range(len(columns))
+        ]
+        writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=schema))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+_WRITERS = {"csv": _stream_csv, "ndjson": _stream_ndjson, "arrow": _stream_arrow}
+
+@router.get("/export")
+def export(
+    format: str = Query("csv"),
+    grain: Optional[str] = Query(None),
+    year: Optional[int] = Query(None),
+    years: Optional[List[int]] = Query(None),
+    state: Optional[str] = Query(None),
+    category: Optional[str] = Query(None),
+    scam_type: Optional[str] = Query(None),
+    contact_method: Optional[str] = Query(None),
+    age_group: Optional[str] = Query(None),
+    gender: Optional[str] = Query(None),
+):
+    """
+    Stream a slice of scam_stats.
+    - Filters match /stats; omitting year/years exports every year.
+    - grain: comma-separated dimensions to aggregate to (default: full grain).
+    - format: csv, ndjson or arrow (Arrow IPC stream, requires pyarrow).
+    """
+    fmt = (format or "").lower()
+    if fmt not in _WRITERS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format {format!r}; choose from {list(_WRITERS)}")
+    if fmt == "arrow":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise HTTPException(status_code=501, detail="Arrow export requires pyarrow.")
+
+    dims = _parse_grain(grain)
+
+    where = ["1=1"]; params: List[Any] = []
+    make_where(
+        where, params,
+        years=years,
+        year=year,
+        state=map_state(state),
+        category=map_category(category),
+        scam_type=map_scam_type(scam_type),
+        contact_method=map_contact_method(contact_method),
+        age_group=map_age_group(age_group),
+        gender=map_gender(gender),
+    )
+    dim_sql = ", ".join(dims)
+
+    if len(dims) == len(DIMENSIONS):
+        # Already at the view grain: no regrouping needed
+        sql = f"""
+          SELECT {dim_sql}, reports::bigint AS reports, losses::float AS losses
+          FROM scam_stats
+          WHERE {" AND ".join(where)}
+          ORDER BY {dim_sql};
+        """
+    else:
+        sql = f"""
+          SELECT {dim_sql}, SUM(reports)::bigint AS reports, SUM(losses)::float AS losses
+          FROM scam_stats
+          WHERE {" AND ".join(where)}
+          GROUP BY {dim_sql}
+          ORDER BY {dim_sql};
+        """
+
+    columns = dims + ["reports", "losses"]
+    batches, stack = _open_batches(sql, params)
+    body = _WRITERS[fmt](columns, batches)
+    ext = "arrows" if fmt == "arrow" else fmt
+    return StreamingResponse(
+        body,
+        media_type=_MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="scam_stats.{ext}"'},
+        # Releases the connection even if the body is never fully consumed
+        background=BackgroundTask(stack.close),
+    )
@@ -6,9 +6,13 @@
 from fastapi import APIRouter
 from typing import Dict, Any
 from app.services.db import get_conn
+from app.services.profiling import ProfiledRoute
 from app.services.population import POPULATION
+from app.services.singleflight import SingleFlight
 
-router = APIRouter(tags=["meta"])
+router = APIRouter(tags=["meta"], route_class=ProfiledRoute)
+
+_filters_flight = SingleFlight("filters")
 
 @router.get("/filters")
 def filters() -> Dict[str, Any]:
@@ -19,8 +23,13 @@ def filters() -> Dict[str, Any]:
       - last 5 years (for default views)
       - latest available year
       - top3_year_locked (2025 if present, else latest year in data)
+    Concurrent callers share a single in-flight lookup.
     """
-    with get_conn() as conn, conn.cursor() as cur:
+    return _filters_flight.do("filters", _load_filters)
+
+def _load_filters() -> Dict[str, Any]:
+    """Run the distinct-value lookups behind /filters."""
+    with get_conn(readonly=True) as conn, conn.cursor() as cur:
         # States
         cur.execute("SELECT DISTINCT state FROM scam_stats WHERE state IS NOT NULL ORDER BY state;")
         states = [r[0] for r in cur.fetchall() if r[0]]
@@ -0,0 +1,351 @@
+# app/routes/stats.py
+# Additional dashboard statistics endpoints under /stats.
+# The main /stats tile payload lives in app/main.py; this router holds
+# the more specialised views built on the same filters and rollups.
+
+import os
+import json
+import base64
+from typing import Optional, List, Dict, Any
+from fastapi import APIRouter, Query, HTTPException, Request, Response
+from pydantic import BaseModel
+from app.services.db import get_conn
+from app.services.profiling import ProfiledRoute
+from app.services.filters import (
+    DIMENSIONS, map_state, map_category, map_scam_type,
+    map_contact_method, map_age_group, map_gender,
+    get_year_bounds, make_where,
+)
+from app.services.responses import EncodedJSON, encoded_response
+from app.services.trends import ALL_STATES, top_contact_trends, contact_trends_for_span
+
+router = APIRouter(prefix="/stats", tags=["stats"], route_class=ProfiledRoute)
+
+COMPARE_MAX_SETS = int(os.getenv("COMPARE_MAX_SETS", "8"))
+
+@router.get("/trends")
+def trends(
+    state: Optional[str] = Query(None),
+    year_from: Optional[int] = Query(None),
+    year_to: Optional[int] = Query(None),
+    all_years: bool = Query(False),
+    limit: int = Query(3, ge=1, le=50),
+) -> Dict[str, Any]:
+    """
+    Contact-method loss trends (start vs end of the window).
+    - No year bounds → last 5 years, read from the precomputed table.
+    - year_from / year_to → arbitrary span; either side may be left open.
+    - all_years=true → unbounded window over the full history.
+    """
+    norm_state = map_state(state)
+    with get_conn(readonly=True) as conn:
+        if not all_years and year_from is None and year_to is None:
+            rows = top_contact_trends(conn, norm_state, limit=limit)
+            window = "last5"
+        else:
+            rows = contact_trends_for_span(
+                conn, norm_state,
+                None if all_years else year_from,
+                None if all_years else year_to,
+                limit=limit,
+            )
+            window = "custom"
+
+    return {
+        "state_applied": norm_state or None,
+        "window": window,
+        "trends": rows,
+    }
+
+class FilterSet(BaseModel):
+    """One comparison panel; fields accept the same values as /stats."""
+    label: Optional[str] = None
+    year: Optional[int] = None
+    state: Optional[str] = None
+    category: Optional[str] = None
+    scam_type: Optional[str] = None
+    contact_method: Optional[str] = None
+    age_group: Optional[str] = None
+    gender: Optional[str] = None
+
+class CompareIn(BaseModel):
+    """Request body schema for the comparison endpoint."""
+    filters: List[FilterSet]
+
+# GROUPING(year, month, category) bitmask for each grouping set
+_G_KPI, _G_SERIES, _G_BREAKDOWN = 7, 1, 6
+
+@router.post("/compare")
+def compare(inp: CompareIn, request: Request) -> Response:
+    """
+    Evaluate KPI, series and breakdown for several filter sets at once.
+    All sets are tagged in a single statement: the filter tuples are joined
+    to scam_stats as a VALUES list and aggregated with GROUPING SETS,
+    so the whole comparison costs one round trip.
+    A set without a year uses the /stats default window (last 5 years).
+    """
+    sets = inp.filters
+    if not sets:
+        raise HTTPException(status_code=400, detail="At least one filter set is required.")
+    if len(sets) > COMPARE_MAX_SETS:
+        raise HTTPException(status_code=400, detail=f"At most {COMPARE_MAX_SETS} filter sets may be compared.")
+
+    normalised = [
+        {
+            "year": fs.year,
+            "state": map_state(fs.state),
+            "category": map_category(fs.category),
+            "scam_type": map_scam_type(fs.scam_type),
+            "contact_method": map_contact_method(fs.contact_method),
+            "age_group": map_age_group(fs.age_group),
+            "gender": map_gender(fs.gender),
+        }
+        for fs in sets
+    ]
+
+    values_sql = ", ".join(
+        ["(%s::int, %s::int, %s::text, %s::text, %s::text, %s::text, %s::text, %s::text)"] * len(normalised)
+    )
+    params: List[Any] = []
+    for idx, f in enumerate(normalised):
+        params.extend([idx, f["year"], f["state"], f["category"], f["scam_type"],
+                       f["contact_method"], f["age_group"], f["gender"]])
+
+    sql = f"""
+      WITH f(idx, yr, state, category, scam_type, contact_method, age_group, gender) AS (
+        VALUES {values_sql}
+      ),
+      bounds AS (
+        SELECT COALESCE(MAX(year), 0) AS max_year FROM scam_stats
+      ),
+      tagged AS (
+        SELECT f.idx, s.year, s.month, s.category, s.reports, s.losses
+        FROM scam_stats s
+        CROSS JOIN bounds b
+        JOIN f ON (CASE WHEN f.yr IS NULL THEN s.year > b.max_year - 5
+                        ELSE s.year = f.yr END)
+              AND (f.state          IS NULL OR s.state          = f.state)
+              AND (f.category       IS NULL OR s.category       = f.category)
+              AND (f.scam_type      IS NULL OR s.scam_type      = f.scam_type)
+              AND (f.contact_method IS NULL OR s.contact_method = f.contact_method)
+              AND (f.age_group      IS NULL OR s.age_group      = f.age_group)
+              AND (f.gender         IS NULL OR s.gender         = f.gender)
+      )
+      SELECT
+        idx,
+        GROUPING(year, month, category)                AS g,
+        year, month, category,
+        COALESCE(SUM(reports), 0)                      AS reports,
+        COALESCE(SUM(losses), 0)::float                AS losses,
+        COALESCE(SUM(CASE WHEN losses IS NOT NULL AND losses > 0
+                          THEN reports ELSE 0 END), 0) AS reports_with_loss
+      FROM tagged
+      GROUP BY GROUPING SETS ((idx), (idx, year, month), (idx, category));
+    """
+
+    kpis: Dict[int, tuple] = {}
+    series: Dict[int, list] = {i: [] for i in range(len(sets))}
+    breakdown: Dict[int, list] = {i: [] for i in range(len(sets))}
+
+    with get_conn(readonly=True) as conn, conn.cursor() as cur:
+        cur.execute(sql, params)
+        for (idx, g, y, m, c, rep, loss, rep_wl) in cur.fetchall():
+            if g == _G_KPI:
+                kpis[idx] = (int(rep or 0), float(loss or 0.0), int(rep_wl or 0))
+            elif g == _G_SERIES:
+                series[idx].append((int(y), int(m), int(rep or 0), float(loss or 0.0)))
+            elif g == _G_BREAKDOWN:
+                breakdown[idx].append((c, int(rep or 0), float(loss or 0.0)))
+
+    results = []
+    for idx, fs in enumerate(sets):
+        total_reports, total_losses, total_reports_with_loss = kpis.get(idx, (0, 0.0, 0))
+        top = sorted(breakdown[idx], key=lambda r: (r[2], r[1]), reverse=True)[:20]
+        results.append({
+            "label": fs.label or f"Set {idx + 1}",
+            "filters": normalised[idx],
+            "kpis": {
+                "total_losses": round(total_losses, 2),
+                "reports": total_reports,
+                "avg_loss": round((total_losses / total_reports), 2) if total_reports else 0.0
+            },
+            "series": [
+                {"period": f"{y}-{m:02d}", "reports": rep, "losses": loss}
+                for (y, m, rep, loss) in sorted(series[idx])
+            ],
+            "breakdown": [
+                {"category": c or "Unknown", "reports": rep, "losses": loss}
+                for (c, rep, loss) in top
+            ],
+            "likelihood": {
+                "likelihood_loss_per_10": (
+                    round((total_reports_with_loss / total_reports) * 10.0, 2)
+                    if total_reports > 0 else 0.0
+                )
+            },
+        })
+
+    return encoded_response(request, EncodedJSON.from_payload({"results": results}))
+
+# -------------------------------------------------
+# Top-N / drill-down with keyset pagination
+# -------------------------------------------------
+_METRICS = {
+    "reports":  "COALESCE(SUM(reports), 0)::bigint",
+    "losses":   "COALESCE(SUM(losses), 0)::float",
+    "avg_loss": "COALESCE(SUM(losses) / NULLIF(SUM(reports), 0), 0)::float",
+}
+_INT_DIMS = {"year", "month"}
+
+# Rollups that can answer a query instead of scam_stats:
+# (table, dimensions it carries, filters it supports)
+_ROLLUPS = [
+    ("scam_contact_yearly", {"state", "contact_method", "year"},
+     {"state", "contact_method"}),
+]
+
+def _dim_expr(d: str) -> str:
+    """Grouping expression for a dimension; NULLs become sortable keys."""
+    return f"COALESCE({d}, 0)" if d in _INT_DIMS else f"COALESCE({d}, 'Unknown')"
+
+def _pick_source(dims: List[str], filters: Dict[str, Any]):
+    """Return (table, extra WHERE clauses) for the smallest covering source."""
+    used = {k for k, v in filters.items() if v}
+    for table, carried, supported in _ROLLUPS:
+        if set(dims) <= carried and used <= supported:
+            if "state" in dims:
+                # IS DISTINCT FROM keeps NULL-state rows (reported as 'Unknown')
+                extra = [f"state IS DISTINCT FROM '{ALL_STATES}'"]
+            elif filters.get("state"):
+                extra = []
+            else:
+                extra = [f"state = '{ALL_STATES}'"]
+            return table, extra
+    return "scam_stats", []
+
+def _encode_cursor(keys: List[Any], rank: int) -> str:
+    raw = json.dumps({"k": keys, "n": rank}).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+def _decode_cursor(cursor: str, width: int):
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        keys, rank = data["k"], int(data["n"])
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+    if not isinstance(keys, list) or len(keys) != width:
+        raise HTTPException(status_code=400, detail="Cursor does not match the requested dimensions.")
+    return keys, rank
+
+@router.get("/top")
+def top(
+    request: Request,
+    dims: str = Query("category"),
+    metric: str = Query("losses"),
+    limit: int = Query(20, ge=1, le=200),
+    cursor: Optional[str] = Query(None),
+    year: Optional[int] = Query(None),
+    state: Optional[str] = Query(None),
+    category: Optional[str] = Query(None),
+    scam_type: Optional[str] = Query(None),
+    contact_method: Optional[str] = Query(None),
+    age_group: Optional[str] = Query(None),
+    gender: Optional[str] = Query(None),
+) -> Response:
+    """
+    Rank groups of any whitelisted dimensions by a metric.
+    - dims: comma-separated list, e.g. "category,scam_type".
+    - metric: reports, losses or avg_loss (descending).
+    - Filters match /stats; without a year the last 5 years are used.
+    - Pass next_cursor back as cursor to fetch the following page.
+    """
+    dim_list = []
+    for d in (x.strip().lower() for x in dims.split(",")):
+        if d and d not in dim_list:
+            dim_list.append(d)
+    unknown = [d for d in dim_list if d not in DIMENSIONS]
+    if not dim_list or unknown:
+        raise HTTPException(status_code=400, detail=f"Invalid dims {unknown or dims!r}; choose from {list(DIMENSIONS)}")
+    if metric not in _METRICS:
+        raise HTTPException(status_code=400, detail=f"Invalid metric {metric!r}; choose from {list(_METRICS)}")
+
+    filters = {
+        "state": map_state(state),
+        "category": map_category(category),
+        "scam_type": map_scam_type(scam_type),
+        "contact_method": map_contact_method(contact_method),
+        "age_group": map_age_group(age_group),
+        "gender": map_gender(gender),
+    }
+    source, where = _pick_source(dim_list, filters)
+
+    # Keyset: order by (metric, dims...) descending and seek past the cursor
+    order_cols = ["metric_value"] + dim_list
+    seek_sql, seek_params, rank = "", [], 0
+    if cursor:
+        keys, rank = _decode_cursor(cursor, len(order_cols))
+        placeholders = ", ".join(["%s"] * len(keys))
+        seek_sql = f"WHERE ({', '.join(order_cols)}) < ({placeholders})"
+        seek_params = keys
+
+    group_cols = ", ".join(f"{_dim_expr(d)} AS {d}" for d in dim_list)
+    group_by = ", ".join(str(i + 1) for i in range(len(dim_list)))
+    order_sql = ", ".join(f"{c} DESC" for c in order_cols)
+
+    with get_conn(readonly=True) as conn:
+        _, last5 = get_year_bounds(conn)
+        params: List[Any] = []
+        make_where(
+            where, params,
+            years=None if year is not None else last5,
+            year=year,
+            **filters,
+        )
+        where_sql = " AND ".join(["1=1"] + where)
+
+        sql = f"""
+          SELECT * FROM (
+            SELECT {group_cols},
+                   COALESCE(SUM(reports), 0)::bigint AS reports,
+                   COALESCE(SUM(losses), 0)::float   AS losses,
+                   {_METRICS[metric]}                AS metric_value
+            FROM {source}
+            WHERE {where_sql}
+            GROUP BY {group_by}
+          ) g
+          {seek_sql}
+          ORDER BY {order_sql}
+          LIMIT %s;
+        """
+        with conn.cursor() as cur:
+            cur.execute(sql, params + seek_params + [limit + 1])
+            rows = cur.fetchall()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    n = len(dim_list)
+
+    out = []
+    for i, r in enumerate(rows):
+        rep, loss = int(r[n] or 0), float(r[n + 1] or 0.0)
+        item = {d: r[j] for j, d in enumerate(dim_list)}
+        item.update({
+            "rank": rank + i + 1,
+            "reports": rep,
+            "losses": loss,
+            "avg_loss": round(loss / rep, 2) if rep else 0.0,
+        })
+        out.append(item)
+
+    next_cursor = None
+    if has_more and rows:
+        last = rows[-1]
+        next_cursor = _encode_cursor([last[n + 2]] + list(last[:n]), rank + len(rows))
+
+    return encoded_response(request, EncodedJSON.from_payload({
+        "dims": dim_list,
+        "metric": metric,
+        "source": source,
+        "rows": out,
+        "next_cursor": next_cursor,
+    }))
@@ -0,0 +1,137 @@
+# app/services/admission.py
+# Admission control for expensive routes.
+# Each configured path prefix gets a concurrency limit and a bounded wait
+# queue. When the queue is full (or a waiter times out) the request is
+# answered immediately with 503 + Retry-After instead of piling up on the
+# database, unless a fallback (e.g. a stale cached /stats body) can serve it.
+
+import os
+import asyncio
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+ADMISSION_LIMITS       = os.getenv(
+    "ADMISSION_LIMITS",
+    "/stats=8:32,/stats/export=2:4,/stats/compare=4:16,/filters=4:16,/detect=8:32",
+)
+ADMISSION_WAIT_TIMEOUT = float(os.getenv("ADMISSION_WAIT_TIMEOUT", "2"))
+ADMISSION_RETRY_AFTER  = int(os.getenv("ADMISSION_RETRY_AFTER", "2"))
+
+class Limiter:
+    """Concurrency limit with a bounded FIFO wait queue."""
+
+    def __init__(self, name: str, max_concurrent: int, max_queue: int):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self._sem: Optional[asyncio.Semaphore] = None
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+
+    async def acquire(self, timeout: float) -> bool:
+        """Wait for a slot; False if the queue is full or the wait times out."""
+        if self._sem is None:
+            self._sem = asyncio.Semaphore(self.max_concurrent)
+        if self._sem.locked() and self.waiting >= self.max_queue:
+            self.rejected += 1
+            return False
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._sem.acquire(), timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            return False
+        finally:
+            self.waiting -= 1
+        self.active += 1
+        self.admitted += 1
+        return True
+
+    def release(self):
+        self.active -= 1
+        self._sem.release()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "limit": self.max_concurrent,
+            "queue": self.max_queue,
+            "active": self.active,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+        }
+
+def parse_limits(spec: str) -> Dict[str, Tuple[int, int]]:
+    """Parse "prefix=concurrency:queue,..." into {prefix: (concurrency, queue)}."""
+    limits = {}
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        prefix, _, value = item.partition("=")
+        conc, _, queue = value.partition(":")
+        limits[prefix.strip()] = (int(conc), int(queue or 0))
+    return limits
+
+LIMITERS: Dict[str, Limiter] = {
+    prefix: Limiter(prefix, conc, queue)
+    for prefix, (conc, queue) in parse_limits(ADMISSION_LIMITS).items()
+}
+
+# Optional per-prefix fallbacks used instead of a 503: fn(scope) -> bytes/headers or None
+Fallback = Callable[[dict], Optional[Tuple[int, Dict[str, str], bytes]]]
+_FALLBACKS: Dict[str, Fallback] = {}
+
+def register_fallback(prefix: str, fn: Fallback):
+    """Register a fallback for requests rejected under prefix."""
+    _FALLBACKS[prefix] = fn
+
+def _match(path: str) -> Optional[str]:
+    """Longest configured prefix matching path on a segment boundary."""
+    best = None
+    for prefix in LIMITERS:
+        if path == prefix or path.startswith(prefix.rstrip("/") + "/"):
+            if best is None or len(prefix) > len(best):
+                best = prefix
+    return best
+
+def busy_response() -> Tuple[int, Dict[str, str], bytes]:
+    """The fast-fail 503 used when a request cannot be admitted."""
+    return (
+        503,
+        {"Retry-After": str(ADMISSION_RETRY_AFTER), "Content-Type": "application/json"},
+        b'{"detail":"Server busy, please retry."}',
+    )
+
+async def _send(send, status: int, headers: Dict[str, str], body: bytes):
+    raw = [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers.items()]
+    raw.append((b"content-length", str(len(body)).encode("latin-1")))
+    await send({"type": "http.response.start", "status": status, "headers": raw})
+    await send({"type": "http.response.body", "body": body})
+
+class AdmissionMiddleware:
+    """ASGI middleware applying the configured per-route limiters."""
+
+    def __init__(self, app: Callable[..., Awaitable[None]]):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        prefix = _match(scope.get("path", "")) if scope["type"] == "http" else None
+        if prefix is None:
+            return await self.app(scope, receive, send)
+
+        limiter = LIMITERS[prefix]
+        if not await limiter.acquire(ADMISSION_WAIT_TIMEOUT):
+            fallback = _FALLBACKS.get(scope.get("path", ""))
+            served = fallback(scope) if fallback else None
+            await _send(send, *(served or busy_response()))
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release()
+
+def metrics() -> Dict[str, Dict[str, int]]:
+    """Return counters for every limiter."""
+    return {prefix: lim.stats() for prefix, lim in LIMITERS.items()}
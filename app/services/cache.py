@@ -0,0 +1,164 @@
+# app/services/cache.py
+# Serving cache for pre-serialised, pre-compressed JSON responses.
+# Entries are keyed by the current data version (SCAM_DATA_VERSION), so a
+# materialized-view refresh invalidates them without explicit purging.
+# Misses fall back to the STATS_SNAPSHOT table filled by the cache warmer.
+# The newest body per key is also kept regardless of version, so it can be
+# served (marked stale) when the database is saturated or unavailable.
+
+import os
+import json
+import time
+import threading
+import logging
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional
+import psycopg2
+from app.services.db import get_conn, has_read_capacity
+from app.services.responses import EncodedJSON
+
+STATS_CACHE_MAX_ENTRIES = int(os.getenv("STATS_CACHE_MAX_ENTRIES", "512"))
+DATA_VERSION_TTL        = float(os.getenv("DATA_VERSION_TTL", "5"))
+
+logger = logging.getLogger("dashboard.cache")
+
+def key_to_text(key: Hashable) -> str:
+    """Stable text form of a cache key (used in STATS_SNAPSHOT)."""
+    return json.dumps(list(key) if isinstance(key, tuple) else key, separators=(",", ":"))
+
+# -------------------------------------------------
+# Data version
+# -------------------------------------------------
+_version_lock = threading.Lock()
+_version_value = 0
+_version_checked = 0.0
+
+def data_version(max_age: float = DATA_VERSION_TTL, readonly: bool = True) -> int:
+    """Return the current data version, re-read at most every max_age seconds."""
+    global _version_value, _version_checked
+    now = time.monotonic()
+    with _version_lock:
+        if now - _version_checked < max_age:
+            return _version_value
+        # Saturated pool: keep the last known version instead of queueing
+        if readonly and _version_checked and not has_read_capacity():
+            return _version_value
+    try:
+        with get_conn(readonly=readonly) as conn, conn.cursor() as cur:
+            cur.execute("SELECT version FROM scam_data_version WHERE id = 1;")
+            row = cur.fetchone()
+        version = int(row[0]) if row else 0
+    except psycopg2.Error as e:
+        # Keep serving the last known version while the DB is unavailable
+        logger.warning("Could not read data version: %s", e)
+        with _version_lock:
+            _version_checked = now
+            return _version_value
+    with _version_lock:
+        _version_value, _version_checked = version, now
+    return version
+
+# -------------------------------------------------
+# Snapshots
+# -------------------------------------------------
+def load_snapshot(version: int, key: Hashable) -> Optional[EncodedJSON]:
+    """Fetch a warmed payload for this data version, if present."""
+    try:
+        with get_conn(readonly=True) as conn, conn.cursor() as cur:
+            cur.execute(
+                "SELECT body FROM stats_snapshot WHERE data_version = %s AND cache_key = %s;",
+                [version, key_to_text(key)],
+            )
+            row = cur.fetchone()
+    except psycopg2.Error as e:
+        logger.warning("Could not read stats snapshot: %s", e)
+        return None
+    return EncodedJSON(bytes(row[0])) if row else None
+
+def save_snapshot(conn, version: int, key: Hashable, body: EncodedJSON):
+    """Upsert a payload into STATS_SNAPSHOT (caller commits)."""
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            INSERT INTO stats_snapshot (data_version, cache_key, body)
+            VALUES (%s, %s, %s)
+            ON CONFLICT (data_version, cache_key)
+            DO UPDATE SET body = EXCLUDED.body, created_at = now();
+            """,
+            [version, key_to_text(key), psycopg2.Binary(body.raw)],
+        )
+
+# -------------------------------------------------
+# In-process cache
+# -------------------------------------------------
+class ResponseCache:
+    """Bounded LRU of encoded bodies, keyed by (data version, key)."""
+
+    def __init__(self, name: str, max_entries: int, snapshots: bool = False):
+        self.name = name
+        self.max_entries = max_entries
+        self.snapshots = snapshots
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[tuple, EncodedJSON]" = OrderedDict()
+        self._latest: "OrderedDict[Hashable, EncodedJSON]" = OrderedDict()
+        self.hits = 0
+        self.snapshot_hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+
+    def get(self, key: Hashable, version: Optional[int] = None) -> Optional[EncodedJSON]:
+        """Return the cached body for key at the given (or current) data version."""
+        version = data_version() if version is None else version
+        with self._lock:
+            body = self._entries.get((version, key))
+            if body is not None:
+                self._entries.move_to_end((version, key))
+                self.hits += 1
+                return body
+
+        # Skip the snapshot lookup when it would have to wait for a connection
+        if self.snapshots and has_read_capacity():
+            body = load_snapshot(version, key)
+            if body is not None:
+                self.put(key, body, version)
+                with self._lock:
+                    self.snapshot_hits += 1
+                return body
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: Hashable, body: EncodedJSON, version: Optional[int] = None):
+        """Store a body (compressing it now) at the given (or current) data version."""
+        version = data_version() if version is None else version
+        body.precompress()
+        with self._lock:
+            self._entries[(version, key)] = body
+            self._entries.move_to_end((version, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._latest[key] = body
+            self._latest.move_to_end(key)
+            while len(self._latest) > self.max_entries:
+                self._latest.popitem(last=False)
+
+    def get_stale(self, key: Hashable) -> Optional[EncodedJSON]:
+        """Return the newest body stored for key, whatever its data version."""
+        with self._lock:
+            body = self._latest.get(key)
+            if body is not None:
+                self.stale_hits += 1
+            return body
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "snapshot_hits": self.snapshot_hits,
+                "misses": self.misses,
+                "stale_hits": self.stale_hits,
+            }
+
+stats_cache = ResponseCache("stats", STATS_CACHE_MAX_ENTRIES, snapshots=True)
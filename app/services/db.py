@@ -1,21 +1,46 @@
 # app/services/db.py
 # Database service module for managing PostgreSQL connections and queries.
+# Connections come from bounded, thread-safe pools so per-session state
+# (such as prepared statements) is reused across requests.
+# Read-only callers can be routed to replicas (SUPABASE_DB_REPLICA_URLS);
+# writes, schema setup and refreshes always use the primary.
 
 import os
+import time
+import itertools
+import threading
 import psycopg2
-from contextlib import contextmanager
+import psycopg2.extensions
+from psycopg2.pool import ThreadedConnectionPool, PoolError
+from contextlib import contextmanager, ExitStack
+from typing import Dict, List, Optional
 from dotenv import load_dotenv
+from app.services.timing import TimedCursor
 import logging
 
 # Load environment variables so DB connection works regardless of entry point
 load_dotenv()
 
+# Checked on first connection, so the app can be imported without it
 DB_URL = os.getenv("SUPABASE_DB_URL")
 
-if not DB_URL:
-    raise RuntimeError(
-        "SUPABASE_DB_URL is not set. Check your .env file in the project root."
-    )
+REPLICA_URLS = [u.strip() for u in os.getenv("SUPABASE_DB_REPLICA_URLS", "").split(",") if u.strip()]
+
+DB_POOL_MIN     = int(os.getenv("DB_POOL_MIN", "1"))
+DB_POOL_MAX     = int(os.getenv("DB_POOL_MAX", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+# Read paths wait only briefly for a connection so they can degrade fast
+DB_READ_CHECKOUT_TIMEOUT = float(os.getenv("DB_READ_CHECKOUT_TIMEOUT", "0.5"))
+# Default per-statement timeout for pooled connections (0 disables)
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "5000"))
+# Prepared statements use "($n IS NULL OR col = $n)" predicates; a generic
+# plan cannot use the per-column indexes, so plan each execution instead
+DB_PLAN_CACHE_MODE = os.getenv("DB_PLAN_CACHE_MODE", "force_custom_plan")
+
+# Replica selection: "round_robin" or "least_latency"
+DB_REPLICA_STRATEGY     = os.getenv("DB_REPLICA_STRATEGY", "round_robin")
+DB_REPLICA_MAX_LAG_S    = float(os.getenv("DB_REPLICA_MAX_LAG_S", "30"))
+DB_REPLICA_CHECK_INTERVAL = float(os.getenv("DB_REPLICA_CHECK_INTERVAL", "10"))
 
 # Configure a basic logger for database interactions
 logger = logging.getLogger("dashboard.db")
@@ -25,23 +50,203 @@ if not logger.handlers:
     logger.addHandler(handler)
 logger.setLevel(logging.INFO)
 
-@contextmanager
-def get_conn():
-    """Provide a managed PostgreSQL connection."""
-    conn = psycopg2.connect(DB_URL)
+class PooledConnection(psycopg2.extensions.connection):
+    """Connection that remembers which statements it has prepared."""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared = set()
+
+class _Target:
+    """One database server (primary or replica) with its own pool."""
+
+    def __init__(self, name: str, url: str, replica: bool):
+        self.name = name
+        self.url = url
+        self.replica = replica
+        self.healthy = True
+        self.latency_ms = 0.0
+        self.lag_s = 0.0
+        self.checkouts = 0
+        self.in_use = 0
+        self._pool: Optional[ThreadedConnectionPool] = None
+        self._lock = threading.Lock()
+        # Bounds concurrent checkouts so callers wait instead of failing fast
+        self._slots = threading.BoundedSemaphore(DB_POOL_MAX)
+
+    def _get_pool(self) -> ThreadedConnectionPool:
+        if not self.url:
+            raise RuntimeError(
+                "SUPABASE_DB_URL is not set. Check your .env file in the project root."
+            )
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    options = f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"
+                    if DB_PLAN_CACHE_MODE:
+                        options += f" -c plan_cache_mode={DB_PLAN_CACHE_MODE}"
+                    if self.replica:
+                        options += " -c default_transaction_read_only=on"
+                    self._pool = ThreadedConnectionPool(
+                        DB_POOL_MIN, DB_POOL_MAX, self.url,
+                        connection_factory=PooledConnection,
+                        cursor_factory=TimedCursor,
+                        options=options,
+                    )
+        return self._pool
+
+    def has_capacity(self) -> bool:
+        """True if a connection can be checked out without waiting."""
+        return self.in_use < DB_POOL_MAX
+
+    @contextmanager
+    def checkout(self, timeout: float = DB_POOL_TIMEOUT):
+        """Borrow a connection; it is rolled back (or discarded) on return."""
+        if not self._slots.acquire(timeout=timeout):
+            raise PoolError(f"Timed out waiting for a {self.name} connection")
+        with self._lock:
+            self.in_use += 1
+        try:
+            pool = self._get_pool()
+            conn = pool.getconn()
+            self.checkouts += 1
+            try:
+                yield conn
+            finally:
+                broken = conn.closed != 0
+                if not broken:
+                    try:
+                        conn.rollback()
+                    except psycopg2.Error:
+                        broken = True
+                pool.putconn(conn, close=broken)
+        finally:
+            with self._lock:
+                self.in_use -= 1
+            self._slots.release()
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "healthy": self.healthy,
+            "latency_ms": round(self.latency_ms, 2),
+            "lag_s": round(self.lag_s, 2),
+            "checkouts": self.checkouts,
+            "in_use": self.in_use,
+        }
+
+_primary = _Target("primary", DB_URL, replica=False)
+_replicas: List[_Target] = [
+    _Target(f"replica{i}", url, replica=True) for i, url in enumerate(REPLICA_URLS)
+]
+_rr = itertools.count()
+
+# -------------------------------------------------
+# Replica health checks
+# -------------------------------------------------
+_LAG_SQL = """
+  SELECT CASE
+    WHEN NOT pg_is_in_recovery() THEN 0
+    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+  END;
+"""
+
+def _check_replica(target: _Target):
+    """Measure round-trip latency and replication lag; update health."""
     try:
+        start = time.perf_counter()
+        with target.checkout() as conn, conn.cursor() as cur:
+            cur.execute(_LAG_SQL)
+            lag = float(cur.fetchone()[0] or 0.0)
+        elapsed_ms = (time.perf_counter() - start) * 1000.0
+        # Smooth latency so one slow probe does not flip the ranking
+        target.latency_ms = elapsed_ms if not target.latency_ms else 0.7 * target.latency_ms + 0.3 * elapsed_ms
+        target.lag_s = lag
+        healthy = lag <= DB_REPLICA_MAX_LAG_S
+    except psycopg2.Error as e:
+        logger.warning("Replica %s health check failed: %s", target.name, e)
+        healthy = False
+    if healthy != target.healthy:
+        logger.warning("Replica %s is now %s", target.name, "healthy" if healthy else "unhealthy")
+    target.healthy = healthy
+
+_health_thread: Optional[threading.Thread] = None
+_health_lock = threading.Lock()
+
+def _health_loop():
+    while True:
+        for target in _replicas:
+            _check_replica(target)
+        time.sleep(DB_REPLICA_CHECK_INTERVAL)
+
+def _ensure_health_checks():
+    """Start the background replica health checker on first use."""
+    global _health_thread
+    if _health_thread is None and _replicas:
+        with _health_lock:
+            if _health_thread is None:
+                _health_thread = threading.Thread(target=_health_loop, name="db-replica-health", daemon=True)
+                _health_thread.start()
+
+def _read_targets() -> List[_Target]:
+    """Healthy replicas in preference order, followed by the primary."""
+    _ensure_health_checks()
+    healthy = [t for t in _replicas if t.healthy]
+    if DB_REPLICA_STRATEGY == "least_latency":
+        healthy.sort(key=lambda t: t.latency_ms)
+    elif healthy:
+        start = next(_rr) % len(healthy)
+        healthy = healthy[start:] + healthy[:start]
+    return healthy + [_primary]
+
+@contextmanager
+def get_conn(statement_timeout_ms: Optional[int] = None, readonly: bool = False):
+    """
+    Provide a managed PostgreSQL connection from the pool.
+    Statements run with DB_STATEMENT_TIMEOUT_MS unless statement_timeout_ms
+    is given (0 disables it); the override lasts until the first commit.
+    readonly=True routes to a healthy replica when configured, falling
+    back to the primary if none can be reached, and waits at most
+    DB_READ_CHECKOUT_TIMEOUT per target for a free connection.
+    """
+    targets = _read_targets() if readonly and _replicas else [_primary]
+    timeout = DB_READ_CHECKOUT_TIMEOUT if readonly else DB_POOL_TIMEOUT
+    with ExitStack() as stack:
+        for target in targets:
+            try:
+                conn = stack.enter_context(target.checkout(timeout))
+            except (psycopg2.OperationalError, PoolError) as e:
+                if target is _primary:
+                    raise
+                logger.warning("Replica %s unavailable, trying next: %s", target.name, e)
+                # A saturated pool is not a sick server
+                if not isinstance(e, PoolError):
+                    target.healthy = False
+                continue
+            break
+
+        if statement_timeout_ms is not None:
+            with conn.cursor() as cur:
+                cur.execute("SET LOCAL statement_timeout = %s;", [int(statement_timeout_ms)])
         yield conn
-    finally:
-        conn.close()
 
-def run_query(sql: str, params=None, fetch: str = "all"):
+def has_read_capacity() -> bool:
+    """True if some read target has a free connection right now."""
+    targets = ([t for t in _replicas if t.healthy] if _replicas else []) + [_primary]
+    return any(t.has_capacity() for t in targets)
+
+def metrics() -> Dict[str, Dict[str, object]]:
+    """Return health and usage counters for every database target."""
+    return {t.name: t.stats() for t in [_primary] + _replicas}
+
+def run_query(sql: str, params=None, fetch: str = "all",
+              statement_timeout_ms: Optional[int] = None, readonly: bool = False):
     """
     Execute a SQL query with optional parameters.
     Logs the query and returns results based on fetch mode.
       - fetch="one" → return single row
       - fetch="all" → return all rows
     """
-    with get_conn() as conn, conn.cursor() as cur:
+    with get_conn(statement_timeout_ms, readonly=readonly) as conn, conn.cursor() as cur:
         logger.info("SQL: %s", sql.replace("\n", " ").strip())
         logger.info("Params: %s", params)
         cur.execute(sql, params or [])
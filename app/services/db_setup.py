@@ -3,14 +3,32 @@
 
 from app.services.db import get_conn
 from app.services.sql_schema import SCHEMA_SQL
+from app.services.partitions import migrate_heap_to_partitioned
+from app.services.rollups import convert_stats_view, rebuild_all
 
 def run_schema():
     """Execute the schema SQL to create or verify required tables."""
-    with get_conn() as conn:
+    # First-time view creation may run for a long time
+    with get_conn(statement_timeout_ms=0) as conn:
         with conn.cursor() as cur:
-            cur.execute(SCHEMA_SQL)
+            cur.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass('scam_data_raw');")
+            row = cur.fetchone()
+        if row and row[0] == "r":
+            # Pre-partitioning deployment: convert the table (runs SCHEMA_SQL too)
+            migrate_heap_to_partitioned(conn)
+        else:
+            # SCAM_STATS used to be a materialized view; recreate it as a table
+            converted = convert_stats_view(conn)
+            with conn.cursor() as cur:
+                cur.execute(SCHEMA_SQL)
+            if converted:
+                rebuild_all(conn)
         conn.commit()
 
 if __name__ == "__main__":
     run_schema()
     print("Schema created/verified.")
+
+    # Non-blocking refresh if raw data changed; re-warms /stats snapshots
+    from app.services.refresh import refresh_views
+    print(refresh_views() or "Views up to date.")
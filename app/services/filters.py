@@ -0,0 +1,186 @@
+# app/services/filters.py
+# Shared normalisation and WHERE-clause helpers for scam_stats queries.
+# Used by /stats and every other endpoint that accepts dashboard filters,
+# so all of them interpret UI filter values identically.
+
+from typing import Optional, List, Any, Tuple
+import re
+
+# Columns that make up the scam_stats grain (safe to use as identifiers)
+DIMENSIONS = (
+    "year", "month", "state", "category",
+    "scam_type", "contact_method", "age_group", "gender",
+)
+
+# -------------------------------------------------
+# Normalisation helpers for query parameters
+# -------------------------------------------------
+def none_if_all(x: Optional[str]) -> Optional[str]:
+    """Map common 'All' values to None (meaning no filter)."""
+    if x is None:
+        return None
+    v = str(x).strip()
+    if not v or v.lower() in {"all", "any", "na", "n/a"}:
+        return None
+    return v
+
+def norm_key(s: str) -> str:
+    """Normalise text: lowercase, replace '&', and remove punctuation."""
+    s = s.lower().replace("&", "and")
+    s = re.sub(r"[^a-z0-9]+", " ", s)
+    return re.sub(r"\s+", " ", s).strip()
+
+# Canonical scam_type values (from DB)
+_CANON_SCAM_TYPES = {
+    "phishing": "Phishing",
+    "identity theft": "Identity theft",
+    "hacking": "Hacking",
+    "remote access scams": "Remote access scams",
+    "overpayment scams": "Overpayment scams",
+    "mobile premium services": "Mobile premium services",
+    "health and medical products": "Health and medical products",
+    "classified scams": "Classified scams",
+    "online shopping scams": "Online shopping scams",
+    "false billing": "False billing",
+    "threats to life arrest or other": "Threats to life, arrest or other",
+    "investment scams": "Investment scams",
+    "dating and romance scams": "Dating and romance scams",
+    "fake charity scams": "Fake charity scams",
+    "unexpected prize and lottery scams": "Unexpected prize & lottery scams",
+    "rebate scams": "Rebate scams",
+    "jobs and employment scams": "Jobs and employment scams",
+    "travel prize scams": "Travel prize scams",
+    "ransomware and malware": "Ransomware and malware",
+    "inheritance and unexpected money": "inheritance and unexpected money",
+    "other scams": "Other scams",
+    "psychic and clairvoyant": "Psychic and clairvoyant",
+    "betting and sports investment scams": "Betting and sports investment scams",
+    "pyramid schemes": "Pyramid schemes",
+    "scratchie scams": "Scratchie scams",
+    "travel prizes and lottery scams": "Travel, prizes and lottery scams",
+    "inheritance scams": "Inheritance scams",
+}
+
+# Aliases to canonical scam_type values
+_SCAM_TYPE_ALIASES = {
+    "unexpected prize & lottery scams": "Unexpected prize & lottery scams",
+    "unexpected prize and lottery": "Unexpected prize & lottery scams",
+    "travel prizes and lottery": "Travel, prizes and lottery scams",
+    "travel prize": "Travel prize scams",
+    "jobs and employment": "Jobs and employment scams",
+    "betting & sports investment scams": "Betting and sports investment scams",
+    "inheritance and unexpected": "inheritance and unexpected money",
+}
+
+def map_scam_type(ui_value: Optional[str]) -> Optional[str]:
+    """Normalise scam_type input to canonical DB value if possible."""
+    v = none_if_all(ui_value)
+    if v is None:
+        return None
+    k = norm_key(v)
+    if k in _CANON_SCAM_TYPES:
+        return _CANON_SCAM_TYPES[k]
+    if k in _SCAM_TYPE_ALIASES:
+        return _SCAM_TYPE_ALIASES[k]
+    return v
+
+# State mapping (short codes to full names)
+STATE_MAP = {
+    "ACT": "Australian Capital Territory",
+    "NSW": "New South Wales",
+    "NT": "Northern Territory",
+    "QLD": "Queensland",
+    "SA": "South Australia",
+    "TAS": "Tasmania",
+    "VIC": "Victoria",
+    "WA": "Western Australia",
+}
+
+def map_state(ui_value: Optional[str]) -> Optional[str]:
+    v = none_if_all(ui_value)
+    if v is None:
+        return None
+    return STATE_MAP.get(v.upper(), v)
+
+def map_category(ui_value: Optional[str]) -> Optional[str]:
+    return none_if_all(ui_value)
+
+def map_contact_method(ui_value: Optional[str]) -> Optional[str]:
+    return none_if_all(ui_value)
+
+def map_age_group(ui_value: Optional[str]) -> Optional[str]:
+    return none_if_all(ui_value)
+
+def map_gender(ui_value: Optional[str]) -> Optional[str]:
+    return none_if_all(ui_value)
+
+# -------------------------------------------------
+# Query helpers
+# -------------------------------------------------
+def get_year_bounds(conn) -> Tuple[int, List[int]]:
+    """Return maximum year and list of last 5 years."""
+    with conn.cursor() as cur:
+        cur.execute("SELECT COALESCE(MAX(year), 0) FROM scam_stats;")
+        row = cur.fetchone()
+        max_year = int(row[0] or 0)
+    if max_year == 0:
+        return 0, []
+    last5 = [y for y in range(max_year, max_year - 5, -1)]
+    return max_year, last5
+
+def make_where(base: List[str], params: List[Any], *,
+               years: Optional[List[int]] = None,
+               year: Optional[int] = None,
+               state: Optional[str] = None,
+               category: Optional[str] = None,
+               scam_type: Optional[str] = None,
+               contact_method: Optional[str] = None,
+               age_group: Optional[str] = None,
+               gender: Optional[str] = None):
+    """Build WHERE clauses and parameter list for queries."""
+    if year is not None:
+        base.append("year = %s"); params.append(year)
+    elif years:
+        placeholders = ",".join(["%s"] * len(years))
+        base.append(f"year IN ({placeholders})"); params.extend(years)
+
+    if state:
+        base.append("state = %s"); params.append(state)
+    if category:
+        base.append("category = %s"); params.append(category)
+    if scam_type:
+        base.append("scam_type = %s"); params.append(scam_type)
+    if contact_method:
+        base.append("contact_method = %s"); params.append(contact_method)
+    if age_group:
+        base.append("age_group = %s"); params.append(age_group)
+    if gender:
+        base.append("gender = %s"); params.append(gender)
+
+# -------------------------------------------------
+# Canonical (fixed-shape) filter predicate
+# -------------------------------------------------
+# One SQL text for every combination of filters, so statements built on it
+# can be prepared once and reused. Pooled connections set
+# plan_cache_mode = force_custom_plan (DB_PLAN_CACHE_MODE) so each execution
+# is planned for its actual values and can use the indexes. Parameters:
+#   $1 years int[], $2 state, $3 category, $4 scam_type,
+#   $5 contact_method, $6 age_group, $7 gender (NULL = no filter)
+CANONICAL_ARG_TYPES = ["int[]", "text", "text", "text", "text", "text", "text"]
+CANONICAL_WHERE = """year = ANY($1)
+            AND ($2::text IS NULL OR state          = $2)
+            AND ($3::text IS NULL OR category       = $3)
+            AND ($4::text IS NULL OR scam_type      = $4)
+            AND ($5::text IS NULL OR contact_method = $5)
+            AND ($6::text IS NULL OR age_group      = $6)
+            AND ($7::text IS NULL OR gender         = $7)"""
+
+def canonical_args(years: List[int],
+                   state: Optional[str] = None,
+                   category: Optional[str] = None,
+                   scam_type: Optional[str] = None,
+                   contact_method: Optional[str] = None,
+                   age_group: Optional[str] = None,
+                   gender: Optional[str] = None) -> List[Any]:
+    """Bind values for CANONICAL_WHERE, in parameter order."""
+    return [list(years), state, category, scam_type, contact_method, age_group, gender]
@@ -0,0 +1,198 @@
+# app/services/partitions.py
+# Year partitions for SCAM_DATA_RAW.
+# Rows for years without a partition land in the DEFAULT partition; the
+# refresh job moves them into per-year partitions (with their own, smaller
+# indexes) via partition_default_rows(). Old years can be detached without
+# touching current data, and per-partition write counters tell the refresh
+# job whether any raw data changed since the last run, and in which years.
+#
+# Usage: python -m app.services.partitions list
+#        python -m app.services.partitions ensure 2024 2025
+#        python -m app.services.partitions detach 2019
+#        python -m app.services.partitions migrate   (heap -> partitioned, one-off)
+
+import re
+import sys
+from typing import Dict, Iterable, List, Optional
+from app.services.db import get_conn
+from app.services.sql_schema import SCHEMA_SQL
+from app.services.rollups import convert_stats_view, rebuild_all
+
+PARENT          = "scam_data_raw"
+DEFAULT_PART    = "scam_data_raw_default"
+_PART_RE        = re.compile(r"^scam_data_raw_y(\d{4})$")
+
+def partition_name(year: int) -> str:
+    return f"{PARENT}_y{int(year)}"
+
+def list_year_partitions(conn) -> Dict[int, str]:
+    """Return {year: partition name} for attached year partitions."""
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT c.relname
+            FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = %s::regclass;
+            """,
+            [PARENT],
+        )
+        names = [r[0] for r in cur.fetchall()]
+    out = {}
+    for name in names:
+        m = _PART_RE.match(name)
+        if m:
+            out[int(m.group(1))] = name
+    return out
+
+def ensure_year_partitions(conn, years: Iterable[Optional[int]]) -> List[int]:
+    """
+    Create missing partitions for the given years (caller commits).
+    Rows for those years already sitting in the default partition are
+    moved into the new partition before it is attached.
+    Returns the years that were created.
+    """
+    wanted = sorted({int(y) for y in years if y is not None})
+    if not wanted:
+        return []
+    with conn.cursor() as cur:
+        # Serialise partition creation between concurrent loaders
+        cur.execute("SELECT pg_advisory_xact_lock(hashtext(%s));", [PARENT + "_partitions"])
+    existing = list_year_partitions(conn)
+
+    created = []
+    with conn.cursor() as cur:
+        for y in wanted:
+            if y in existing:
+                continue
+            name = partition_name(y)
+            cur.execute(f"CREATE TABLE {name} (LIKE {PARENT} INCLUDING DEFAULTS);")
+            # Matching CHECK lets ATTACH skip its validation scan
+            cur.execute(f"ALTER TABLE {name} ADD CONSTRAINT {name}_year_chk CHECK (year IS NOT NULL AND year = {y});")
+            cur.execute(
+                f"""
+                WITH moved AS (
+                  DELETE FROM {DEFAULT_PART} WHERE year = %s RETURNING *
+                )
+                INSERT INTO {name} SELECT * FROM moved;
+                """,
+                [y],
+            )
+            cur.execute(f"ALTER TABLE {PARENT} ATTACH PARTITION {name} FOR VALUES IN ({y});")
+            cur.execute(f"ALTER TABLE {name} ADD PRIMARY KEY (id);")
+            created.append(y)
+    return created
+
+def detach_year(conn, year: int) -> str:
+    """
+    Detach a year's partition (caller commits). The table is kept as a
+    standalone table for archiving; its year is rebuilt in SCAM_STATS at
+    the next refresh, so its rows drop out.
+    """
+    name = partition_name(year)
+    with conn.cursor() as cur:
+        cur.execute(f"ALTER TABLE {PARENT} DETACH PARTITION {name};")
+    return name
+
+def partition_write_counters(conn) -> Dict[str, int]:
+    """
+    Return cumulative inserted+updated+deleted row counts per partition
+    (from pg_stat_user_tables). Two differing snapshots mean raw data
+    changed in between.
+    """
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT s.relname, s.n_tup_ins + s.n_tup_upd + s.n_tup_del
+            FROM pg_stat_user_tables s
+            JOIN pg_inherits i ON i.inhrelid = s.relid
+            WHERE i.inhparent = %s::regclass;
+            """,
+            [PARENT],
+        )
+        return {name: int(n or 0) for name, n in cur.fetchall()}
+
+def changed_years(before: Optional[Dict[str, int]], after: Dict[str, int]) -> Optional[List[int]]:
+    """
+    Years whose partitions were written to, created or detached between
+    two partition_write_counters() snapshots. Returns None when the change
+    cannot be narrowed to years: no earlier snapshot, a change in the
+    DEFAULT partition (its rows may belong to any year) or a counter that
+    went backwards (statistics were reset).
+    """
+    if before is None:
+        return None
+    years = set()
+    for name in set(before) | set(after):
+        old, new = before.get(name), after.get(name)
+        if old == new:
+            continue
+        if old is not None and new is not None and new < old:
+            return None
+        m = _PART_RE.match(name)
+        if not m:
+            return None
+        years.add(int(m.group(1)))
+    return sorted(years)
+
+def partition_default_rows(conn) -> List[int]:
+    """
+    Create partitions for every year currently sitting in the DEFAULT
+    partition, moving those rows out of it (caller commits).
+    Returns the years that were created.
+    """
+    with conn.cursor() as cur:
+        cur.execute(f"SELECT DISTINCT year FROM {DEFAULT_PART} WHERE year IS NOT NULL;")
+        years = [r[0] for r in cur.fetchall()]
+    return ensure_year_partitions(conn, years)
+
+def migrate_heap_to_partitioned(conn):
+    """
+    One-off migration of an existing unpartitioned SCAM_DATA_RAW (caller commits).
+    The old table is renamed, the schema is recreated (dependent
+    materialized views included), rows are copied into year partitions
+    and the old table is dropped. ids are checked for duplicates by the
+    per-partition keys as rows are copied.
+    """
+    with conn.cursor() as cur:
+        cur.execute("SELECT relkind FROM pg_class WHERE oid = %s::regclass;", [PARENT])
+        if cur.fetchone()[0] == "p":
+            return False
+
+        cur.execute(f"ALTER TABLE {PARENT} RENAME TO {PARENT}_heap;")
+        # Index names are schema-wide; free them for the partitioned table
+        cur.execute("""
+            DROP INDEX IF EXISTS idx_raw_year, idx_raw_date, idx_raw_state, idx_raw_category,
+                                 idx_raw_type, idx_raw_contact, idx_raw_age, idx_raw_gender;
+        """)
+    # Views still reference the old table; they are rebuilt by SCHEMA_SQL
+    convert_stats_view(conn)
+    with conn.cursor() as cur:
+        cur.execute(SCHEMA_SQL)
+        cur.execute(f"SELECT DISTINCT year FROM {PARENT}_heap WHERE year IS NOT NULL;")
+        years = [r[0] for r in cur.fetchall()]
+
+    ensure_year_partitions(conn, years)
+
+    with conn.cursor() as cur:
+        cur.execute(f"INSERT INTO {PARENT} SELECT * FROM {PARENT}_heap;")
+        cur.execute(f"DROP TABLE {PARENT}_heap;")
+    rebuild_all(conn)
+    with conn.cursor() as cur:
+        cur.execute("UPDATE scam_data_version SET version = version + 1, refreshed_at = now();")
+    return True
+
+if __name__ == "__main__":
+    cmd, args = (sys.argv[1] if len(sys.argv) > 1 else "list"), sys.argv[2:]
+    with get_conn(statement_timeout_ms=0) as conn:
+        if cmd == "ensure":
+            print("Created:", ensure_year_partitions(conn, [int(a) for a in args]))
+        elif cmd == "detach":
+            for a in args:
+                print("Detached:", detach_year(conn, int(a)))
+        elif cmd == "migrate":
+            print("Migrated." if migrate_heap_to_partitioned(conn) else "Already partitioned.")
+        else:
+            for y, name in sorted(list_year_partitions(conn).items()):
+                print(y, name)
+        conn.commit()
@@ -0,0 +1,73 @@
+# app/services/plan_check.py
+# Verifies that the prepared /stats statements keep index-driven plans.
+# For common filter combinations it runs EXPLAIN EXECUTE on every registered
+# statement (app.services.prepared.STATEMENTS) and flags sequential scans of scam_stats where a selective
+# filter (state, category, scam type, ...) should have allowed an index.
+#
+# Usage: python -m app.services.plan_check [--generic]
+#   By default plans are checked with the pool's plan_cache_mode
+#   (DB_PLAN_CACHE_MODE, force_custom_plan), as in production.
+#   --generic  check the generic plan instead: what Postgres switches to
+#              after five executions if DB_PLAN_CACHE_MODE is unset
+
+import sys
+import json
+from typing import Any, Dict, List
+from app.services.db import get_conn
+from app.services.filters import STATE_MAP, get_year_bounds
+from app.services.prepared import STATEMENTS, prepare
+import app.services.stats  # noqa: F401  (registers the /stats statements)
+
+def _combinations(max_year: int, last5: List[int]) -> List[Dict[str, Any]]:
+    """Common dashboard filter combinations (name, years, filters, selective)."""
+    nsw = STATE_MAP["NSW"]
+    return [
+        {"name": "default window",        "years": last5,      "filters": {},                       "selective": False},
+        {"name": "single year",           "years": [max_year], "filters": {},                       "selective": False},
+        {"name": "state",                 "years": last5,      "filters": {"state": nsw},           "selective": True},
+        {"name": "state + year",          "years": [max_year], "filters": {"state": nsw},           "selective": True},
+        {"name": "scam type",             "years": last5,      "filters": {"scam_type": "Phishing"}, "selective": True},
+        {"name": "state + contact method", "years": last5,     "filters": {"state": nsw, "contact_method": "Email"}, "selective": True},
+    ]
+
+def _seq_scanned_relations(plan: Dict[str, Any]) -> List[str]:
+    """Return relation names that appear under a Seq Scan node."""
+    found = []
+    if plan.get("Node Type") == "Seq Scan":
+        found.append(plan.get("Relation Name", "").lower())
+    for child in plan.get("Plans", []):
+        found.extend(_seq_scanned_relations(child))
+    return found
+
+def check_plans(generic: bool = False) -> List[str]:
+    """EXPLAIN every statement/combination; return a list of problems."""
+    problems = []
+    with get_conn() as conn, conn.cursor() as cur:
+        max_year, last5 = get_year_bounds(conn)
+        if generic:
+            cur.execute("SET LOCAL plan_cache_mode = force_generic_plan;")
+        for combo in _combinations(max_year, last5):
+            for st in STATEMENTS.values():
+                if st.plan_args is None:
+                    print(f"{st.name:<16} {combo['name']:<24} not checked (no plan args)")
+                    continue
+                args = st.plan_args(combo["years"], combo["filters"])
+                if args is None:
+                    continue
+                prepare(cur, st)
+                placeholders = ", ".join(["%s"] * len(args))
+                cur.execute(f"EXPLAIN (FORMAT JSON) EXECUTE {st.name} ({placeholders})", args)
+                raw = cur.fetchone()[0]
+                plan = (raw if isinstance(raw, list) else json.loads(raw))[0]["Plan"]
+                seq = _seq_scanned_relations(plan)
+                status = "seq scan" if "scam_stats" in seq else "index"
+                print(f"{st.name:<16} {combo['name']:<24} {status}")
+                if combo["selective"] and "scam_stats" in seq:
+                    problems.append(f"{st.name} / {combo['name']}: sequential scan of scam_stats")
+    return problems
+
+if __name__ == "__main__":
+    problems = check_plans(generic="--generic" in sys.argv[1:])
+    for p in problems:
+        print("FAIL:", p)
+    sys.exit(1 if problems else 0)
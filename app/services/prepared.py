@@ -0,0 +1,45 @@
+# app/services/prepared.py
+# Server-side prepared statements for fixed-shape queries.
+# Each statement is PREPAREd once per pooled connection (tracked on the
+# connection itself) and then run with EXECUTE and bound parameters,
+# so Postgres skips parsing and analysis on every request.
+
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+# Builds bind values for the plan check from (years, filters); returns
+# None when the statement does not apply to that filter combination
+PlanArgs = Callable[[List[int], Dict[str, Any]], Optional[List[Any]]]
+
+class Statement:
+    """A named statement: parameter types and a body using $1..$n."""
+    __slots__ = ("name", "arg_types", "sql", "plan_args")
+
+    def __init__(self, name: str, arg_types: Sequence[str], sql: str,
+                 plan_args: Optional[PlanArgs] = None):
+        self.name = name
+        self.arg_types = list(arg_types)
+        self.sql = sql
+        self.plan_args = plan_args
+
+# All registered statements by name (used by the plan check)
+STATEMENTS: Dict[str, Statement] = {}
+
+def statement(name: str, arg_types: Sequence[str], sql: str,
+              plan_args: Optional[PlanArgs] = None) -> Statement:
+    """Register a fixed-shape statement under a unique name."""
+    st = Statement(name, arg_types, sql, plan_args)
+    STATEMENTS[name] = st
+    return st
+
+def prepare(cur, st: Statement):
+    """PREPARE st on the cursor's connection unless already done."""
+    prepared = cur.connection.prepared
+    if st.name not in prepared:
+        cur.execute(f"PREPARE {st.name} ({', '.join(st.arg_types)}) AS {st.sql}")
+        prepared.add(st.name)
+
+def execute(cur, st: Statement, args: List[Any]):
+    """Run a prepared statement with bound parameters."""
+    prepare(cur, st)
+    placeholders = ", ".join(["%s"] * len(args))
+    cur.execute(f"EXECUTE {st.name} ({placeholders})", args)
@@ -0,0 +1,189 @@
+# app/services/profiling.py
+# Opt-in request profiling.
+# A request is profiled when it carries the admin token in the X-Profile
+# header (PROFILE_ADMIN_TOKEN) or is picked by PROFILE_SAMPLE_RATE.
+# Profiled requests get per-phase timings (db, model, rules, serialise)
+# in a Server-Timing header, and a low-overhead sampling profiler writes
+# their stacks in collapsed ("folded") format to PROFILE_DIR, ready for
+# flamegraph.pl or speedscope. Only the thread running the endpoint is
+# sampled, from endpoint entry to exit (routes use ProfiledRoute).
+# phase() and TimedCursor live in app.services.timing so non-web code can
+# record timings without importing FastAPI.
+
+import os
+import re
+import sys
+import hmac
+import time
+import asyncio
+import functools
+import random
+import logging
+import threading
+import anyio
+from contextlib import contextmanager
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+from fastapi.routing import APIRoute
+from app.services.timing import current_profile
+
+PROFILE_ADMIN_TOKEN    = os.getenv("PROFILE_ADMIN_TOKEN", "")
+PROFILE_SAMPLE_RATE    = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_DIR            = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_MAX_FILES      = int(os.getenv("PROFILE_MAX_FILES", "50"))
+PROFILE_INTERVAL_MS    = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_MAX_CONCURRENT = int(os.getenv("PROFILE_MAX_CONCURRENT", "2"))
+
+logger = logging.getLogger("dashboard.profiling")
+
+class _Session:
+    """Timings and sampled stacks for one profiled request."""
+
+    def __init__(self, sample: bool):
+        self.timings: Dict[str, float] = Counter()
+        # Threads currently running this request's endpoint
+        self.threads: Set[int] = set()
+        self.stacks: Counter = Counter()
+        self.sample = sample
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self.sample:
+            self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+
+    def _run(self):
+        interval = PROFILE_INTERVAL_MS / 1000.0
+        while not self._stop.wait(interval):
+            frames = sys._current_frames()
+            for tid in list(self.threads):
+                frame = frames.get(tid)
+                if frame is not None:
+                    self.stacks[_collapse(frame)] += 1
+
+_samplers = threading.BoundedSemaphore(PROFILE_MAX_CONCURRENT)
+
+def _collapse(frame) -> str:
+    """Render a stack root-first as 'func (file:line);...'."""
+    parts = []
+    while frame is not None:
+        code = frame.f_code
+        parts.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+        frame = frame.f_back
+    return ";".join(reversed(parts))
+
+@contextmanager
+def _sampled_thread():
+    """Sample the current thread for the active profile while inside the block."""
+    session = current_profile.get()
+    if session is None:
+        yield
+        return
+    tid = threading.get_ident()
+    session.threads.add(tid)
+    try:
+        yield
+    finally:
+        session.threads.discard(tid)
+
+def _track_endpoint(endpoint):
+    """Wrap a sync endpoint so its worker thread is sampled while it runs."""
+    if getattr(endpoint, "_profiled", False) or asyncio.iscoroutinefunction(endpoint):
+        # Async endpoints share the event-loop thread; they are not sampled
+        return endpoint
+
+    @functools.wraps(endpoint)
+    def wrapper(*args, **kwargs):
+        with _sampled_thread():
+            return endpoint(*args, **kwargs)
+
+    wrapper._profiled = True
+    return wrapper
+
+class ProfiledRoute(APIRoute):
+    """APIRoute whose endpoint thread is sampled during profiled requests."""
+
+    def __init__(self, path: str, endpoint: Callable[..., Any], **kwargs):
+        super().__init__(path, _track_endpoint(endpoint), **kwargs)
+
+# -------------------------------------------------
+# Profile files
+# -------------------------------------------------
+_SLUG_RE = re.compile(r"[^A-Za-z0-9]+")
+
+def _write_profile(scope: dict, session: _Session, total_ms: float):
+    """Write collapsed stacks and prune the directory to PROFILE_MAX_FILES."""
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    slug = _SLUG_RE.sub("_", scope.get("path", "")).strip("_") or "root"
+    name = f"{time.strftime('%Y%m%dT%H%M%S')}-{scope.get('method', 'GET')}-{slug}-{int(total_ms)}ms.folded"
+    with open(os.path.join(PROFILE_DIR, name), "w", encoding="utf-8") as f:
+        for stack, count in session.stacks.most_common():
+            f.write(f"{stack} {count}\n")
+
+    files = sorted(
+        (os.path.join(PROFILE_DIR, n) for n in os.listdir(PROFILE_DIR) if n.endswith(".folded")),
+        key=os.path.getmtime,
+    )
+    for path in files[:-PROFILE_MAX_FILES]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+def _server_timing(session: _Session, total_ms: float) -> bytes:
+    parts = [f"{name};dur={ms:.1f}" for name, ms in session.timings.items()]
+    parts.append(f"total;dur={total_ms:.1f}")
+    return ", ".join(parts).encode("latin-1")
+
+def _requested(scope: dict) -> bool:
+    if PROFILE_ADMIN_TOKEN:
+        for name, value in scope.get("headers", []):
+            if name == b"x-profile":
+                return hmac.compare_digest(value, PROFILE_ADMIN_TOKEN.encode("latin-1"))
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+class ProfilingMiddleware:
+    """ASGI middleware that profiles opted-in requests."""
+
+    def __init__(self, app: Callable[..., Awaitable[None]]):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not _requested(scope):
+            return await self.app(scope, receive, send)
+
+        # Timings are always collected; stack sampling is capped
+        sample = _samplers.acquire(blocking=False)
+        session = _Session(sample)
+        token = current_profile.set(session)
+        start = time.perf_counter()
+        session.start()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                total_ms = (time.perf_counter() - start) * 1000.0
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", _server_timing(session, total_ms)))
+                message = dict(message, headers=headers)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            current_profile.reset(token)
+            session.stop()
+            if sample:
+                _samplers.release()
+                try:
+                    # File I/O and directory pruning stay off the event loop
+                    await anyio.to_thread.run_sync(
+                        _write_profile, scope, session, (time.perf_counter() - start) * 1000.0,
+                    )
+                except OSError as e:
+                    logger.warning("Could not write profile: %s", e)
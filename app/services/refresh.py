@@ -0,0 +1,166 @@
+# app/services/refresh.py
+# Refresh service for the reporting rollups.
+# Moves newly loaded rows out of the DEFAULT raw partition into per-year
+# partitions, detects new raw data (per-partition write counters), rebuilds
+# the SCAM_STATS years whose partitions changed (everything if that cannot
+# be told), refreshes SCAM_CONTACT_YEARLY and SCAM_CONTACT_TRENDS
+# CONCURRENTLY so dashboard reads never block, logs the run in
+# SCAM_REFRESH_LOG, bumps SCAM_DATA_VERSION and re-warms the /stats cache.
+# A session advisory lock ensures only one worker refreshes at a time.
+#
+# Usage: python -m app.services.refresh [--force] [--loop SECONDS]
+# In-app: set REFRESH_INTERVAL_S > 0 to run the check in a background thread.
+
+import os
+import sys
+import json
+import time
+import threading
+import logging
+from typing import Dict, Optional
+import psycopg2
+from app.services.db import get_conn
+from app.services.partitions import changed_years, partition_default_rows, partition_write_counters
+from app.services.rollups import DERIVED_VIEWS, rebuild_stats
+
+REFRESH_INTERVAL_S = float(os.getenv("REFRESH_INTERVAL_S", "0"))
+REFRESH_LOCK_KEY   = int(os.getenv("REFRESH_LOCK_KEY", "727001"))
+REFRESH_WARM       = os.getenv("REFRESH_WARM", "1") != "0"
+
+# Reported in view_rows; each one is built from the one before it
+VIEWS = ("scam_stats",) + DERIVED_VIEWS
+
+logger = logging.getLogger("dashboard.refresh")
+
+def _last_counters(conn) -> Optional[Dict[str, int]]:
+    with conn.cursor() as cur:
+        cur.execute("SELECT raw_counters FROM scam_refresh_log ORDER BY id DESC LIMIT 1;")
+        row = cur.fetchone()
+    return row[0] if row else None
+
+def refresh_views(force: bool = False, warm: bool = REFRESH_WARM) -> Optional[dict]:
+    """
+    Refresh the reporting rollups if raw data changed (or force=True).
+    Only SCAM_STATS years whose partitions changed are rebuilt; force=True
+    rebuilds all of them. Returns a summary of the run, or None if it was
+    skipped because nothing changed or another worker holds the refresh lock.
+    """
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_try_advisory_lock(%s);", [REFRESH_LOCK_KEY])
+            if not cur.fetchone()[0]:
+                logger.info("Refresh already running elsewhere; skipping.")
+                return None
+        try:
+            # Session-level (committed), so it survives the per-view commits
+            # below; reset before the connection goes back to the pool
+            with conn.cursor() as cur:
+                cur.execute("SET statement_timeout = 0;")
+            conn.commit()
+
+            created = partition_default_rows(conn)
+            if created:
+                logger.info("Created raw partitions for years %s", created)
+            conn.commit()
+
+            # Snapshot counters first so writes during the refresh trigger the next run
+            counters = partition_write_counters(conn)
+            last = _last_counters(conn)
+            if not force and last == counters:
+                conn.commit()
+                return None
+            years = None if force else changed_years(last, counters)
+
+            started = time.time()
+            timings = {}
+            t0 = time.perf_counter()
+            years = rebuild_stats(conn, years)
+            conn.commit()
+            timings["scam_stats"] = round((time.perf_counter() - t0) * 1000.0)
+
+            with conn.cursor() as cur:
+                for view in DERIVED_VIEWS:
+                    t0 = time.perf_counter()
+                    cur.execute(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {view};")
+                    conn.commit()
+                    timings[view] = round((time.perf_counter() - t0) * 1000.0)
+
+                view_rows = {}
+                for view in VIEWS:
+                    cur.execute(f"SELECT count(*) FROM {view};")
+                    view_rows[view] = int(cur.fetchone()[0])
+
+                duration_ms = int((time.time() - started) * 1000.0)
+                cur.execute(
+                    """
+                    UPDATE scam_data_version
+                    SET version = version + 1, refreshed_at = now()
+                    WHERE id = 1
+                    RETURNING version;
+                    """
+                )
+                version = int(cur.fetchone()[0])
+                cur.execute(
+                    """
+                    INSERT INTO scam_refresh_log
+                      (started_at, duration_ms, data_version, raw_counters, view_rows, rebuilt_years)
+                    VALUES (to_timestamp(%s), %s, %s, %s, %s, %s);
+                    """,
+                    [started, duration_ms, version, json.dumps(counters), json.dumps(view_rows),
+                     json.dumps(years) if years is not None else None],
+                )
+            conn.commit()
+        finally:
+            conn.rollback()
+            with conn.cursor() as cur:
+                cur.execute("RESET statement_timeout;")
+                cur.execute("SELECT pg_advisory_unlock(%s);", [REFRESH_LOCK_KEY])
+            # Commit so the RESET survives the rollback checkout() does on return
+            conn.commit()
+
+    summary = {
+        "data_version": version,
+        "duration_ms": duration_ms,
+        "view_ms": timings,
+        "view_rows": view_rows,
+        "rebuilt_years": years,
+    }
+    logger.info("Refreshed rollups: %s", summary)
+
+    if warm:
+        from app.services.warmer import warm_stats_cache
+        summary["warmed"] = warm_stats_cache()
+    return summary
+
+# -------------------------------------------------
+# Background task
+# -------------------------------------------------
+_refresh_thread: Optional[threading.Thread] = None
+
+def _refresh_loop(interval: float):
+    while True:
+        try:
+            refresh_views()
+        except psycopg2.Error as e:
+            logger.warning("Background refresh failed: %s", e)
+        time.sleep(interval)
+
+def start_background_refresh(interval: float = REFRESH_INTERVAL_S):
+    """Start the periodic refresh check in a daemon thread (no-op if interval <= 0)."""
+    global _refresh_thread
+    if interval <= 0 or _refresh_thread is not None:
+        return
+    _refresh_thread = threading.Thread(
+        target=_refresh_loop, args=(interval,), name="view-refresh", daemon=True,
+    )
+    _refresh_thread.start()
+
+if __name__ == "__main__":
+    force = "--force" in sys.argv
+    if "--loop" in sys.argv:
+        interval = float(sys.argv[sys.argv.index("--loop") + 1])
+        while True:
+            print(refresh_views(force=force) or "No refresh needed.")
+            force = False
+            time.sleep(interval)
+    print(refresh_views(force=force) or "No refresh needed.")
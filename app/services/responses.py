@@ -0,0 +1,119 @@
+# app/services/responses.py
+# Fast JSON response helpers.
+# Payloads are serialised once (orjson when installed, stdlib json otherwise)
+# and their gzip/brotli variants are computed once and kept alongside,
+# so cached responses skip both serialisation and compression.
+
+import os
+import gzip
+import json
+from typing import Any, Optional
+from fastapi import Request, Response
+from fastapi.responses import JSONResponse
+from app.services.timing import phase
+
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+_brotli = None
+_brotli_checked = False
+
+def _get_brotli():
+    """Import brotli on first use; None if it is not installed."""
+    global _brotli, _brotli_checked
+    if not _brotli_checked:
+        try:
+            import brotli
+            _brotli = brotli
+        except ImportError:
+            _brotli = None
+        _brotli_checked = True
+    return _brotli
+
+def dumps(payload: Any) -> bytes:
+    """Serialise a payload to compact UTF-8 JSON."""
+    with phase("serialise"):
+        if orjson is not None:
+            return orjson.dumps(payload)
+        return json.dumps(
+            payload, ensure_ascii=False, allow_nan=False, separators=(",", ":")
+        ).encode("utf-8")
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse that renders with the fast serialiser."""
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+class EncodedJSON:
+    """An already-serialised JSON body with lazily cached compressed variants."""
+    __slots__ = ("raw", "_gzip", "_br")
+
+    def __init__(self, raw: bytes):
+        self.raw = raw
+        self._gzip: Optional[bytes] = None
+        self._br: Optional[bytes] = None
+
+    @classmethod
+    def from_payload(cls, payload: Any) -> "EncodedJSON":
+        return cls(dumps(payload))
+
+    def gzip(self) -> bytes:
+        if self._gzip is None:
+            self._gzip = gzip.compress(self.raw, compresslevel=6, mtime=0)
+        return self._gzip
+
+    def br(self) -> Optional[bytes]:
+        brotli = _get_brotli()
+        if brotli is None:
+            return None
+        if self._br is None:
+            self._br = brotli.compress(self.raw, quality=5)
+        return self._br
+
+    def precompress(self) -> "EncodedJSON":
+        """Compute compressed variants now (e.g. before caching)."""
+        if len(self.raw) >= COMPRESS_MIN_BYTES:
+            self.gzip()
+            self.br()
+        return self
+
+def _accepted(header: str) -> dict:
+    """Parse an Accept-Encoding header into {coding: q}."""
+    out = {}
+    for part in header.split(","):
+        fields = part.strip().split(";")
+        coding = fields[0].strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for f in fields[1:]:
+            f = f.strip()
+            if f.startswith("q="):
+                try:
+                    q = float(f[2:])
+                except ValueError:
+                    q = 0.0
+        out[coding] = q
+    return out
+
+def encoded_response(request: Request, body: EncodedJSON, status_code: int = 200,
+                     headers: Optional[dict] = None) -> Response:
+    """Return body with the best Content-Encoding the client accepts."""
+    hdrs = {"Vary": "Accept-Encoding"}
+    hdrs.update(headers or {})
+    content = body.raw
+
+    if len(body.raw) >= COMPRESS_MIN_BYTES:
+        accepted = _accepted(request.headers.get("accept-encoding", ""))
+        with phase("serialise"):
+            if accepted.get("br", 0) > 0 and body.br() is not None:
+                content = body.br(); hdrs["Content-Encoding"] = "br"
+            elif accepted.get("gzip", 0) > 0:
+                content = body.gzip(); hdrs["Content-Encoding"] = "gzip"
+
+    return Response(content=content, status_code=status_code,
+                    media_type="application/json", headers=hdrs)
@@ -0,0 +1,89 @@
+# app/services/rollups.py
+# Maintenance of the SCAM_STATS rollup table.
+# SCAM_STATS is a plain table rather than a materialized view so the
+# refresh job can rebuild only the years whose raw partitions changed:
+# a year's rows are deleted and re-aggregated from the raw table in the
+# same transaction, so readers see the old or the new rows for that year,
+# never a mix. A full rebuild is used when the changed years are unknown.
+# SCAM_CONTACT_YEARLY and SCAM_CONTACT_TRENDS stay materialized views
+# over SCAM_STATS and are refreshed after it.
+
+from typing import Iterable, List, Optional
+
+# Materialized views built on SCAM_STATS, in refresh order
+DERIVED_VIEWS = ("scam_contact_yearly", "scam_contact_trends")
+
+# Aggregates {source} into the SCAM_STATS grain
+_ROLLUP_SQL = """
+INSERT INTO scam_stats
+  (year, month, state, category, scam_type, contact_method, age_group, gender,
+   reports, losses, avg_loss)
+SELECT
+  COALESCE(year, EXTRACT(YEAR FROM date)::INT),
+  EXTRACT(MONTH FROM date)::INT,
+  state,
+  scam_category,
+  scam_type,
+  contact_method,
+  age_group,
+  gender,
+  SUM(number_of_reports),
+  SUM(aggregated_amount_lost)::NUMERIC,
+  CASE WHEN SUM(number_of_reports) > 0
+       THEN SUM(aggregated_amount_lost) / SUM(number_of_reports)
+       ELSE 0
+  END
+FROM {source} AS r
+GROUP BY
+  COALESCE(year, EXTRACT(YEAR FROM date)::INT),
+  EXTRACT(MONTH FROM date)::INT,
+  state, scam_category, scam_type, contact_method, age_group, gender;
+"""
+
+# Raw rows whose rollup year is in %(years)s. The first branch is pruned to
+# the year partitions; rows without a year only live in the DEFAULT one.
+_YEARS_SOURCE = """(
+  SELECT * FROM scam_data_raw WHERE year = ANY(%(years)s)
+  UNION ALL
+  SELECT * FROM scam_data_raw
+  WHERE year IS NULL AND EXTRACT(YEAR FROM date)::INT = ANY(%(years)s)
+)"""
+
+def rebuild_stats(conn, years: Optional[Iterable[int]] = None) -> Optional[List[int]]:
+    """
+    Re-aggregate SCAM_STATS from the raw table (caller commits).
+    With years, only those years are replaced; otherwise the whole table
+    is. Returns the rebuilt years, or None for a full rebuild.
+    """
+    with conn.cursor() as cur:
+        if years is None:
+            # DELETE rather than TRUNCATE so readers are never blocked
+            cur.execute("DELETE FROM scam_stats;")
+            cur.execute(_ROLLUP_SQL.format(source="scam_data_raw"))
+            return None
+        years = sorted({int(y) for y in years})
+        if years:
+            cur.execute("DELETE FROM scam_stats WHERE year = ANY(%s);", [years])
+            cur.execute(_ROLLUP_SQL.format(source=_YEARS_SOURCE), {"years": years})
+        return years
+
+def rebuild_all(conn):
+    """Full SCAM_STATS rebuild plus a blocking refresh of DERIVED_VIEWS (caller commits)."""
+    rebuild_stats(conn)
+    with conn.cursor() as cur:
+        for view in DERIVED_VIEWS:
+            cur.execute(f"REFRESH MATERIALIZED VIEW {view};")
+
+def convert_stats_view(conn) -> bool:
+    """
+    Drop SCAM_STATS if it is still a materialized view (older deployments),
+    together with DERIVED_VIEWS. The caller then runs SCHEMA_SQL and
+    rebuild_all(), and commits. Returns True if the view was dropped.
+    """
+    with conn.cursor() as cur:
+        cur.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass('scam_stats');")
+        row = cur.fetchone()
+        if not row or row[0] != "m":
+            return False
+        cur.execute("DROP MATERIALIZED VIEW scam_stats CASCADE;")
+    return True
@@ -0,0 +1,102 @@
+# app/services/singleflight.py
+# Request coalescing ("singleflight") for identical concurrent calls.
+# The first caller for a key runs the work; callers arriving while it is
+# in flight wait for and share the same result (or exception).
+# Supports both sync handlers (threads) and async handlers (event loop).
+
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+# All flights by name, for metrics reporting
+FLIGHTS: Dict[str, "SingleFlight"] = {}
+
+class _Call:
+    """State of one in-flight sync call."""
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result: Any = None
+        self.error: BaseException = None
+
+class SingleFlight:
+    """Coalesce concurrent calls that share the same key."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self._futures: Dict[Hashable, asyncio.Future] = {}
+        self.executed = 0
+        self.merged = 0
+        FLIGHTS[name] = self
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """Run fn() once per key among concurrent sync callers."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.executed += 1
+            else:
+                self.merged += 1
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+
+    async def do_async(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Await fn() once per key among concurrent callers on the event loop."""
+        with self._lock:
+            fut = self._futures.get(key)
+            leader = fut is None
+            if leader:
+                fut = self._futures[key] = asyncio.get_running_loop().create_future()
+                self.executed += 1
+            else:
+                self.merged += 1
+
+        if not leader:
+            # Shield so a cancelled waiter does not cancel the shared result
+            return await asyncio.shield(fut)
+
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            fut.cancel()
+            raise
+        except BaseException as e:
+            fut.set_exception(e)
+            fut.exception()  # mark retrieved when nobody else is waiting
+            raise
+        else:
+            fut.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._futures.pop(key, None)
+
+    def stats(self) -> Dict[str, int]:
+        """Return counters for this flight."""
+        with self._lock:
+            in_flight = len(self._calls) + len(self._futures)
+        return {"executed": self.executed, "merged": self.merged, "in_flight": in_flight}
+
+def metrics() -> Dict[str, Dict[str, int]]:
+    """Return counters for every registered flight."""
+    return {name: f.stats() for name, f in FLIGHTS.items()}
@@ -1,7 +1,8 @@
 # app/services/sql_schema.py
 # SQL schema definition for ScamBot data.
-# Includes raw table for CSV ingestion, materialized view for reporting,
-# and indexes to support efficient dashboard queries.
+# Includes a year-partitioned raw table for CSV ingestion, a rollup table
+# and materialized views for reporting (including precomputed
+# contact-method trends), and indexes to support efficient dashboard queries.
 
 SCHEMA_SQL = """
 -- Enable UUID support if not already available
@@ -9,9 +10,17 @@ CREATE EXTENSION IF NOT EXISTS pgcrypto;
 
 -- =========================================================
 -- 1) Raw table (directly stores CSV-derived fields)
+--    Partitioned by year: one partition per year (SCAM_DATA_RAW_Y<year>,
+--    created on demand by app.services.partitions) plus a default
+--    partition for NULL or not-yet-partitioned years.
+--    Each year partition carries its own primary key on id and the
+--    default partition a unique index on id. Uniqueness is therefore
+--    per partition only: a unique index on the parent would have to
+--    include year, so ids are kept distinct across partitions only by
+--    gen_random_uuid().
 -- =========================================================
 CREATE TABLE IF NOT EXISTS SCAM_DATA_RAW (
-  id uuid PRIMARY KEY DEFAULT gen_random_uuid(),
+  id uuid NOT NULL DEFAULT gen_random_uuid(),
 
   date                    DATE,      -- original "Date"
   state                   TEXT,      -- original "State"
@@ -23,10 +32,16 @@ CREATE TABLE IF NOT EXISTS SCAM_DATA_RAW (
   aggregated_amount_lost  NUMERIC,   -- original "Aggregated Amount Lost"
   number_of_reports       INT,       -- original "Number of Reports"
   year                    INT        -- original "Year"
-);
+) PARTITION BY LIST (year);
+
+CREATE TABLE IF NOT EXISTS SCAM_DATA_RAW_DEFAULT
+  PARTITION OF SCAM_DATA_RAW DEFAULT;
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_raw_default_id
+  ON SCAM_DATA_RAW_DEFAULT(id);
 
--- Indexes on raw table
-CREATE INDEX IF NOT EXISTS idx_raw_year      ON SCAM_DATA_RAW(year);
+-- Indexes on raw table (created on every partition;
+-- year needs no index because partitions are pruned by year)
 CREATE INDEX IF NOT EXISTS idx_raw_date      ON SCAM_DATA_RAW(date);
 CREATE INDEX IF NOT EXISTS idx_raw_state     ON SCAM_DATA_RAW(state);
 CREATE INDEX IF NOT EXISTS idx_raw_category  ON SCAM_DATA_RAW(scam_category);
@@ -36,33 +51,27 @@ CREATE INDEX IF NOT EXISTS idx_raw_age       ON SCAM_DATA_RAW(age_group);
 CREATE INDEX IF NOT EXISTS idx_raw_gender    ON SCAM_DATA_RAW(gender);
 
 -- =========================================================
--- 2) Materialized view for dashboard queries
---    Aggregated by year, month, state, category, type, contact method, age, gender
+-- 2) Rollup table for dashboard queries
+--    Aggregated by year, month, state, category, type, contact method, age, gender.
+--    A plain table (not a materialized view): app.services.rollups
+--    rebuilds only the years whose raw partitions changed.
 -- =========================================================
-CREATE MATERIALIZED VIEW IF NOT EXISTS SCAM_STATS AS
-SELECT
-  COALESCE(year, EXTRACT(YEAR FROM date)::INT) AS year,
-  EXTRACT(MONTH FROM date)::INT                AS month,
-  state,
-  scam_category                                AS category,
-  scam_type,
-  contact_method,
-  age_group,
-  gender,
-  SUM(number_of_reports)                       AS reports,
-  SUM(aggregated_amount_lost)::NUMERIC         AS losses,
-  CASE WHEN SUM(number_of_reports) > 0
-       THEN SUM(aggregated_amount_lost) / SUM(number_of_reports)
-       ELSE 0
-  END                                          AS avg_loss
-FROM SCAM_DATA_RAW
-GROUP BY
-  COALESCE(year, EXTRACT(YEAR FROM date)::INT),
-  EXTRACT(MONTH FROM date)::INT,
-  state, scam_category, scam_type, contact_method, age_group, gender;
+CREATE TABLE IF NOT EXISTS SCAM_STATS (
+  year            INT,
+  month           INT,
+  state           TEXT,
+  category        TEXT,
+  scam_type       TEXT,
+  contact_method  TEXT,
+  age_group       TEXT,
+  gender          TEXT,
+  reports         BIGINT,
+  losses          NUMERIC,
+  avg_loss        NUMERIC
+);
 
 -- =========================================================
--- 3) Indexes on materialized view
+-- 3) Indexes on rollup table
 -- =========================================================
 CREATE INDEX IF NOT EXISTS idx_stats_year_month ON SCAM_STATS(year, month);
 CREATE INDEX IF NOT EXISTS idx_stats_state      ON SCAM_STATS(state);
@@ -73,21 +82,104 @@ CREATE INDEX IF NOT EXISTS idx_stats_age        ON SCAM_STATS(age_group);
 CREATE INDEX IF NOT EXISTS idx_stats_gender     ON SCAM_STATS(gender);
 
 -- =========================================================
--- 4) Unique index on materialized view grain
---    Required for concurrent refresh
+-- 4) Unique index on rollup grain
 -- =========================================================
 CREATE UNIQUE INDEX IF NOT EXISTS uq_stats_grain
   ON SCAM_STATS(year, month, state, category, scam_type, contact_method, age_group, gender);
 
 -- =========================================================
--- 5) Initial refresh (blocking)
---    Safe to run after first load
+-- 5) Contact-method rollups for the breaking-news tile
+--    SCAM_CONTACT_YEARLY: losses per (state, contact method, year);
+--    all-Australia totals are stored with state = 'ALL'.
+--    SCAM_CONTACT_TRENDS: start/end losses and % change over the
+--    last 5 years of data, precomputed per state and for 'ALL'.
+--    Both must be refreshed after SCAM_STATS is rebuilt, in this order.
 -- =========================================================
-REFRESH MATERIALIZED VIEW SCAM_STATS;
+CREATE MATERIALIZED VIEW IF NOT EXISTS SCAM_CONTACT_YEARLY AS
+SELECT
+  CASE WHEN GROUPING(state) = 1 THEN 'ALL' ELSE state END AS state,
+  contact_method,
+  year,
+  SUM(reports)                                 AS reports,
+  SUM(losses)::NUMERIC                         AS losses
+FROM SCAM_STATS
+GROUP BY GROUPING SETS ((state, contact_method, year), (contact_method, year));
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_contact_yearly
+  ON SCAM_CONTACT_YEARLY(state, contact_method, year);
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS SCAM_CONTACT_TRENDS AS
+WITH windowed AS (
+  SELECT c.state, c.contact_method, c.year, c.losses::float AS losses
+  FROM SCAM_CONTACT_YEARLY c,
+       (SELECT MAX(year) AS max_year FROM SCAM_CONTACT_YEARLY) b
+  WHERE c.year > b.max_year - 5
+),
+span AS (
+  SELECT state, contact_method, MIN(year) AS y0, MAX(year) AS y1
+  FROM windowed
+  GROUP BY state, contact_method
+)
+SELECT
+  s.state,
+  s.contact_method,
+  s.y0                                         AS year_start,
+  s.y1                                         AS year_end,
+  COALESCE(
+    CASE WHEN b0.losses IS NULL OR b0.losses = 0 THEN NULL
+         ELSE (b1.losses - b0.losses) / b0.losses * 100.0
+    END, 0.0
+  )                                            AS pct_change,
+  COALESCE(b0.losses, 0.0)                     AS losses_start,
+  COALESCE(b1.losses, 0.0)                     AS losses_end
+FROM span s
+LEFT JOIN windowed b0 ON b0.state = s.state AND b0.contact_method = s.contact_method AND b0.year = s.y0
+LEFT JOIN windowed b1 ON b1.state = s.state AND b1.contact_method = s.contact_method AND b1.year = s.y1;
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_contact_trends
+  ON SCAM_CONTACT_TRENDS(state, contact_method);
+CREATE INDEX IF NOT EXISTS idx_contact_trends_rank
+  ON SCAM_CONTACT_TRENDS(state, pct_change DESC);
 
 -- =========================================================
--- 6) Recommended refresh after subsequent loads:
---    REFRESH MATERIALIZED VIEW CONCURRENTLY SCAM_STATS;
---    (enabled by the unique index on the view grain)
+-- 6) Data version and precomputed /stats snapshots
+--    SCAM_DATA_VERSION holds a single row bumped after every refresh;
+--    API caches key their entries on it.
+--    STATS_SNAPSHOT stores pre-serialised /stats payloads per version.
 -- =========================================================
+CREATE TABLE IF NOT EXISTS SCAM_DATA_VERSION (
+  id            INT PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+  version       BIGINT      NOT NULL DEFAULT 1,
+  refreshed_at  TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+INSERT INTO SCAM_DATA_VERSION (id) VALUES (1) ON CONFLICT (id) DO NOTHING;
+
+CREATE TABLE IF NOT EXISTS STATS_SNAPSHOT (
+  data_version  BIGINT      NOT NULL,
+  cache_key     TEXT        NOT NULL,
+  body          BYTEA       NOT NULL,
+  created_at    TIMESTAMPTZ NOT NULL DEFAULT now(),
+  PRIMARY KEY (data_version, cache_key)
+);
+
+-- =========================================================
+-- 7) Refresh log
+--    One row per refresh run by app.services.refresh, with timings,
+--    resulting row counts, the raw-partition write counters seen at
+--    refresh time (used to detect newly loaded data) and the SCAM_STATS
+--    years rebuilt in that run (NULL for a full rebuild).
+--    Views are refreshed CONCURRENTLY there, so readers never block;
+--    CREATE MATERIALIZED VIEW above already populates them on first run.
+-- =========================================================
+CREATE TABLE IF NOT EXISTS SCAM_REFRESH_LOG (
+  id             BIGSERIAL   PRIMARY KEY,
+  started_at     TIMESTAMPTZ NOT NULL,
+  finished_at    TIMESTAMPTZ NOT NULL DEFAULT now(),
+  duration_ms    INT         NOT NULL,
+  data_version   BIGINT      NOT NULL,
+  raw_counters   JSONB       NOT NULL,
+  view_rows      JSONB       NOT NULL,
+  rebuilt_years  JSONB
+);
+ALTER TABLE SCAM_REFRESH_LOG ADD COLUMN IF NOT EXISTS rebuilt_years JSONB;
 """
@@ -0,0 +1,104 @@
+# app/services/startup_check.py
+# Startup budget check for the API process.
+# Measures the import time of app.main (python -X importtime) and the time
+# from launching uvicorn to the first successful /healthz, and verifies
+# that heavy ML / Supabase modules are not imported at startup.
+# Fails (exit 1) when a budget is exceeded.
+#
+# Usage: python -m app.services.startup_check
+# Budgets: STARTUP_IMPORT_BUDGET_MS, STARTUP_HEALTHZ_BUDGET_MS
+
+import os
+import sys
+import time
+import socket
+import subprocess
+import urllib.request
+from typing import List, Optional, Set, Tuple
+
+STARTUP_IMPORT_BUDGET_MS  = float(os.getenv("STARTUP_IMPORT_BUDGET_MS", "1500"))
+STARTUP_HEALTHZ_BUDGET_MS = float(os.getenv("STARTUP_HEALTHZ_BUDGET_MS", "4000"))
+STARTUP_FORBIDDEN_MODULES = [
+    m.strip() for m in os.getenv(
+        "STARTUP_FORBIDDEN_MODULES", "joblib,sklearn,numpy,scipy,pandas,supabase,pyarrow",
+    ).split(",") if m.strip()
+]
+
+def measure_imports(module: str = "app.main") -> Tuple[float, Set[str]]:
+    """Return (cumulative import time in ms, top-level packages imported) for a module."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+
+    total_us = 0
+    packages: Set[str] = set()
+    # Lines look like: "import time:       123 |       4567 |   app.main"
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[1].strip().isdigit():
+            continue
+        name = fields[2].strip()
+        packages.add(name.split(".")[0])
+        if name == module:
+            total_us = int(fields[1])
+    return total_us / 1000.0, packages
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def measure_healthz(timeout_s: float = 30.0) -> Optional[float]:
+    """Launch uvicorn and return ms until /healthz answers 200 (None on timeout)."""
+    port = _free_port()
+    url = f"http://127.0.0.1:{port}/healthz"
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+    )
+    try:
+        while time.perf_counter() - start < timeout_s:
+            if proc.poll() is not None:
+                return None
+            try:
+                with urllib.request.urlopen(url, timeout=1) as resp:
+                    if resp.status == 200:
+                        return (time.perf_counter() - start) * 1000.0
+            except OSError:
+                time.sleep(0.02)
+        return None
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+
+def check_startup() -> List[str]:
+    """Run all startup checks; return a list of failures."""
+    problems = []
+
+    import_ms, packages = measure_imports()
+    print(f"import app.main: {import_ms:.0f} ms (budget {STARTUP_IMPORT_BUDGET_MS:.0f} ms)")
+    if import_ms > STARTUP_IMPORT_BUDGET_MS:
+        problems.append(f"import time {import_ms:.0f} ms exceeds {STARTUP_IMPORT_BUDGET_MS:.0f} ms")
+    heavy = sorted(set(STARTUP_FORBIDDEN_MODULES) & packages)
+    if heavy:
+        problems.append(f"heavy modules imported at startup: {', '.join(heavy)}")
+
+    healthz_ms = measure_healthz()
+    if healthz_ms is None:
+        problems.append("/healthz did not become ready")
+    else:
+        print(f"first /healthz: {healthz_ms:.0f} ms (budget {STARTUP_HEALTHZ_BUDGET_MS:.0f} ms)")
+        if healthz_ms > STARTUP_HEALTHZ_BUDGET_MS:
+            problems.append(f"time to /healthz {healthz_ms:.0f} ms exceeds {STARTUP_HEALTHZ_BUDGET_MS:.0f} ms")
+    return problems
+
+if __name__ == "__main__":
+    problems = check_startup()
+    for p in problems:
+        print("FAIL:", p)
+    sys.exit(1 if problems else 0)
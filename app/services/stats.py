@@ -0,0 +1,214 @@
+# app/services/stats.py
+# Computes the /stats dashboard payload for a set of normalised filters.
+# Kept outside app.main so background jobs (e.g. the cache warmer) can
+# build the same payload without importing the web application.
+# Every section uses one fixed statement shape, prepared once per pooled
+# connection and executed with bound parameters.
+# All sections and the data version are read in one REPEATABLE READ
+# snapshot, so a payload is always cached under the version it reflects.
+
+from typing import Any, Dict, Tuple
+from app.services.db import get_conn
+from app.services.filters import (
+    map_state, map_category, map_scam_type, map_contact_method,
+    map_age_group, map_gender, get_year_bounds,
+    CANONICAL_ARG_TYPES, CANONICAL_WHERE, canonical_args,
+)
+from app.services.prepared import statement, execute
+from app.services.trends import top_contact_trends
+
+# ---------------- Statements ----------------
+def _canonical_plan_args(years, filters):
+    return canonical_args(years, **filters)
+
+def _state_plan_args(build):
+    """Plan-check binder for statements filtered by year and state only."""
+    def binder(years, filters):
+        if set(filters) - {"state"}:
+            return None
+        return build(max(years), filters.get("state"))
+    return binder
+
+KPI_STMT = statement("stats_kpi", CANONICAL_ARG_TYPES, f"""
+  SELECT
+    COALESCE(SUM(reports), 0)                       AS reports,
+    COALESCE(SUM(losses), 0)::float                 AS losses,
+    COALESCE(SUM(CASE WHEN losses IS NOT NULL AND losses > 0
+                       THEN reports ELSE 0 END), 0) AS reports_with_loss
+  FROM scam_stats
+  WHERE {CANONICAL_WHERE}
+""", plan_args=_canonical_plan_args)
+
+SERIES_STMT = statement("stats_series", CANONICAL_ARG_TYPES, f"""
+  SELECT year, month, SUM(reports) AS reports, SUM(losses)::float AS losses
+  FROM scam_stats
+  WHERE {CANONICAL_WHERE}
+  GROUP BY year, month
+  ORDER BY year, month
+""", plan_args=_canonical_plan_args)
+
+BREAKDOWN_STMT = statement("stats_breakdown", CANONICAL_ARG_TYPES, f"""
+  SELECT category, SUM(reports) AS reports, SUM(losses)::float AS losses
+  FROM scam_stats
+  WHERE {CANONICAL_WHERE}
+  GROUP BY category
+  ORDER BY losses DESC NULLS LAST, reports DESC NULLS LAST
+  LIMIT 20
+""", plan_args=_canonical_plan_args)
+
+# $1 year, $2 state
+TOP3_STMT = statement("stats_top3", ["int", "text"], """
+  SELECT category, scam_type, contact_method,
+         SUM(losses)::float AS losses, SUM(reports) AS reports
+  FROM scam_stats
+  WHERE year = $1
+    AND ($2::text IS NULL OR state = $2)
+  GROUP BY category, scam_type, contact_method
+  ORDER BY losses DESC NULLS LAST, reports DESC NULLS LAST
+  LIMIT 3
+""", plan_args=_state_plan_args(lambda y, st: [y, st]))
+
+# $1 year, $2 first month, $3 last month, $4 state
+RATE_STMT = statement("stats_rate", ["int", "int", "int", "text"], """
+  SELECT COALESCE(SUM(losses), 0)::float
+  FROM scam_stats
+  WHERE year = $1
+    AND month BETWEEN $2 AND $3
+    AND ($4::text IS NULL OR state = $4)
+""", plan_args=_state_plan_args(lambda y, st: [y, 1, 4, st]))
+
+def stats_key(year, state, category, scam_type, contact_method, age_group, gender):
+    """Normalised filter tuple identifying a /stats result."""
+    return (
+        year,
+        map_state(state),
+        map_category(category),
+        map_scam_type(scam_type),
+        map_contact_method(contact_method),
+        map_age_group(age_group),
+        map_gender(gender),
+    )
+
+def compute_stats(year, norm_state, norm_category, norm_scam_type,
+                  norm_contact_method, norm_age_group, norm_gender,
+                  readonly: bool = True) -> Tuple[int, Dict[str, Any]]:
+    """
+    Run the /stats queries for already-normalised filters.
+    Returns (data version, payload), both read from the same snapshot.
+    Reads go to a replica unless readonly=False (e.g. right after a refresh,
+    when replicas may not have caught up yet).
+    """
+    with get_conn(readonly=readonly) as conn:
+        with conn.cursor() as cur:
+            cur.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY;")
+            cur.execute("SELECT version FROM scam_data_version WHERE id = 1;")
+            row = cur.fetchone()
+            version = int(row[0]) if row else 0
+
+        max_year, last5 = get_year_bounds(conn)
+
+        # ---------------- KPI + SERIES + BREAKDOWN ----------------
+        args = canonical_args(
+            [year] if year is not None else last5,  # default window
+            state=norm_state,
+            category=norm_category,
+            scam_type=norm_scam_type,
+            contact_method=norm_contact_method,
+            age_group=norm_age_group,
+            gender=norm_gender,
+        )
+
+        with conn.cursor() as cur:
+            execute(cur, KPI_STMT, args)
+            r_reports, r_losses, r_reports_with_loss = cur.fetchone()
+            total_reports = int(r_reports or 0)
+            total_losses  = float(r_losses or 0.0)
+            total_reports_with_loss = int(r_reports_with_loss or 0)
+
+            execute(cur, SERIES_STMT, args)
+            rows = cur.fetchall()
+            series = [
+                {"period": f"{int(y)}-{int(m):02d}",
+                 "reports": int(rep or 0),
+                 "losses": float(loss or 0.0)}
+                for (y, m, rep, loss) in rows
+            ]
+
+            execute(cur, BREAKDOWN_STMT, args)
+            breakdown = [
+                {"category": c or "Unknown",
+                 "reports": int(rep or 0),
+                 "losses": float(loss or 0.0)}
+                for (c, rep, loss) in cur.fetchall()
+            ]
+
+        # ---------------- Likelihood tiles ----------------
+        likelihood_loss_per_10 = (
+            round((total_reports_with_loss / total_reports) * 10.0, 2)
+            if total_reports > 0 else 0.0
+        )
+
+        # ---------------- Top 3 scams by loss ----------------
+        top3_year = 2025 if (max_year and 2025 <= max_year) else max_year
+        with conn.cursor() as cur:
+            execute(cur, TOP3_STMT, [top3_year, norm_state])
+            top3 = [
+                {
+                    "category": c or "Unknown",
+                    "scam_type": st or "Unknown",
+                    "contact_method": cm or "Unknown",
+                    "losses": float(ls or 0.0),
+                    "reports": int(rp or 0),
+                    "year": top3_year,
+                }
+                for (c, st, cm, ls, rp) in cur.fetchall()
+            ]
+
+        # ---------------- Breaking news ----------------
+        # Precomputed at refresh time in scam_contact_trends (last 5 years)
+        breaking_news = [
+            {
+                "contact_method": t["contact_method"],
+                "pct_change": t["pct_change"],
+                "losses_start": t["losses_start"],
+                "losses_end": t["losses_end"],
+                "window_years": last5,
+            }
+            for t in top_contact_trends(conn, norm_state, limit=3)
+        ]
+
+        # ---------------- Loss per minute (2025 Jan–Apr) ----------------
+        rate_year = 2025
+        rate_month_start, rate_month_end = 1, 4
+        with conn.cursor() as cur:
+            execute(cur, RATE_STMT, [rate_year, rate_month_start, rate_month_end, norm_state])
+            total_loss_2025_4mo = float(cur.fetchone()[0] or 0.0)
+
+        minutes_in_window = 120 * 24 * 60  # Jan–Apr 2025 = 120 days
+        loss_per_minute_2025_4mo = (
+            round(total_loss_2025_4mo / minutes_in_window, 2) if minutes_in_window > 0 else 0.0
+        )
+
+    # Final JSON response
+    return version, {
+        "kpis": {
+            "total_losses": round(total_losses, 2),
+            "reports": total_reports,
+            "avg_loss": round((total_losses / total_reports), 2) if total_reports else 0.0
+        },
+        "series": series,
+        "breakdown": breakdown,
+        "likelihood": {
+            "likelihood_loss_per_10": likelihood_loss_per_10
+        },
+        "top3_by_loss": top3,
+        "breaking_news": breaking_news,
+        "loss_per_minute_2025_4mo": {
+            "year": 2025,
+            "months": [1, 2, 3, 4],
+            "state_applied": norm_state or None,
+            "total_loss_window": round(total_loss_2025_4mo, 2),
+            "minutes_in_window": minutes_in_window,
+            "rate_per_minute": loss_per_minute_2025_4mo
+        }
+    }
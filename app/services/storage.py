@@ -2,24 +2,84 @@
 # Handles loading of ML model artifacts.
 # Prefers local files for faster development,
 # with fallback to Supabase storage if not found locally.
+# Remote artifacts are described by a version manifest; blobs are cached
+# on disk by checksum so only changed files are downloaded.
+# joblib (which unpickles sklearn/numpy) and the Supabase client are
+# imported on first load, so importing this module stays cheap.
 
-import os, io, joblib
+import os, io, gzip, json, hashlib, tempfile
 from functools import lru_cache
-from supabase import create_client
+from app.services.singleflight import SingleFlight
 
 SUPABASE_URL  = os.getenv("SUPABASE_URL")
 SUPABASE_KEY  = os.getenv("SUPABASE_SERVICE_KEY")
 BUCKET        = os.getenv("SUPABASE_STORAGE_BUCKET", "artifacts")
 VERSION       = os.getenv("MODEL_VERSION", "v1")
 LOCAL_DIR     = os.getenv("LOCAL_ART_DIR", f"artifacts_local/model_{VERSION}")
+CACHE_DIR     = os.getenv("ARTIFACT_CACHE_DIR", "artifacts_cache")
+
+def _is_not_found(exc: Exception) -> bool:
+    """True if a storage error means the object does not exist."""
+    info = exc.args[0] if exc.args else None
+    if isinstance(info, dict):
+        status = str(info.get("statusCode") or info.get("status") or "")
+        error = str(info.get("error") or "").lower()
+        message = str(info.get("message") or "").lower()
+        return status == "404" or error == "not_found" or "not found" in message
+    return "not found" in str(exc).lower()
+
+def _fetch_manifest(bucket_api):
+    """
+    Return the version manifest, or None for legacy (pre-manifest) uploads.
+    Only a missing manifest means legacy; other errors (auth, network) propagate.
+    """
+    try:
+        raw = bucket_api.download(f"model_{VERSION}/manifest.json")
+    except Exception as e:
+        if _is_not_found(e):
+            return None
+        raise
+    return json.loads(raw)
+
+def _cached_blob(bucket_api, entry: dict) -> str:
+    """
+    Return a local path for a manifest entry.
+    Downloads and verifies the blob only if it is not already cached.
+    """
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = os.path.join(CACHE_DIR, f"{entry['sha256']}.joblib")
+    if os.path.exists(path) and os.path.getsize(path) == entry["size"]:
+        return path
+
+    data = gzip.decompress(bucket_api.download(entry["blob"]))
+    if hashlib.sha256(data).hexdigest() != entry["sha256"]:
+        raise RuntimeError(f"Checksum mismatch for artifact blob {entry['blob']}")
+
+    # Write atomically so concurrent workers never read a partial file
+    fd, tmp = tempfile.mkstemp(dir=CACHE_DIR, suffix=".part")
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+    return path
+
+# Concurrent first callers share one download/unpickle
+_artifacts_flight = SingleFlight("artifacts")
 
-@lru_cache(maxsize=1)
 def load_artifacts():
+    """Return (model, vectorizer), loading them once per process."""
+    if _load_artifacts.cache_info().currsize:
+        return _load_artifacts()
+    return _artifacts_flight.do("artifacts", _load_artifacts)
+
+@lru_cache(maxsize=1)
+def _load_artifacts():
     """
     Load model and vectorizer artifacts.
     - First checks local directory (for faster development)
     - Falls back to Supabase storage if local artifacts are not found
     """
+    import joblib
+
     # Local preference
     if LOCAL_DIR and os.path.isdir(LOCAL_DIR):
         model = joblib.load(os.path.join(LOCAL_DIR, "model.joblib"))
@@ -27,10 +87,21 @@ def load_artifacts():
         return model, vect
 
     # Remote fallback: download from Supabase
+    from supabase import create_client
     client = create_client(SUPABASE_URL, SUPABASE_KEY)
+    bucket_api = client.storage.from_(BUCKET)
+
+    manifest = _fetch_manifest(bucket_api)
+    if manifest is not None:
+        files = manifest["files"]
+        model = joblib.load(_cached_blob(bucket_api, files["model.joblib"]))
+        vect  = joblib.load(_cached_blob(bucket_api, files["vectorizer.joblib"]))
+        return model, vect
+
+    # Legacy layout: uncompressed files under model_<VERSION>/
     base = f"model_{VERSION}"
-    mbytes = client.storage.from_(BUCKET).download(f"{base}/model.joblib")
-    vbytes = client.storage.from_(BUCKET).download(f"{base}/vectorizer.joblib")
+    mbytes = bucket_api.download(f"{base}/model.joblib")
+    vbytes = bucket_api.download(f"{base}/vectorizer.joblib")
     model = joblib.load(io.BytesIO(mbytes))
     vect  = joblib.load(io.BytesIO(vbytes))
     return model, vect
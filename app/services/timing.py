@@ -0,0 +1,43 @@
+# app/services/timing.py
+# Per-phase timings for profiled requests, free of any web framework so
+# the database layer can use it. app.services.profiling opens a session
+# per profiled request; phase() and TimedCursor add to its timings.
+# Outside profiled requests, phase() is a single context-variable lookup.
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Optional
+import psycopg2.extensions
+
+# Active profiling session (an object with a `timings` Counter), if any
+current_profile: ContextVar[Optional[Any]] = ContextVar("profile_session", default=None)
+
+@contextmanager
+def phase(name: str):
+    """Attribute the enclosed time to a named phase of the current profiled request."""
+    session = current_profile.get()
+    if session is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        session.timings[name] += (time.perf_counter() - start) * 1000.0
+
+class TimedCursor(psycopg2.extensions.cursor):
+    """Cursor whose statements count towards the "db" phase."""
+
+    def execute(self, query, vars=None):
+        with phase("db"):
+            return super().execute(query, vars)
+
+    def executemany(self, query, vars_list):
+        with phase("db"):
+            return super().executemany(query, vars_list)
+
+    def fetchmany(self, size=None):
+        # Named cursors fetch from the server here
+        with phase("db"):
+            return super().fetchmany(size) if size is not None else super().fetchmany()
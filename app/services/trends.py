@@ -0,0 +1,77 @@
+# app/services/trends.py
+# Contact-method loss trends for the breaking-news tile.
+# The default last-5-year window is read straight from the precomputed
+# SCAM_CONTACT_TRENDS view; other spans are derived from the small
+# SCAM_CONTACT_YEARLY rollup instead of regrouping SCAM_STATS.
+
+from typing import Optional, List, Dict, Any
+
+# State value used for all-Australia rows in the contact rollups
+ALL_STATES = "ALL"
+
+def _rows_to_trends(rows) -> List[Dict[str, Any]]:
+    return [
+        {
+            "contact_method": cm or "Unknown",
+            "pct_change": round(float(pct or 0.0), 2),
+            "losses_start": float(ls0 or 0.0),
+            "losses_end": float(ls1 or 0.0),
+            "year_start": int(y0) if y0 is not None else None,
+            "year_end": int(y1) if y1 is not None else None,
+        }
+        for (cm, pct, ls0, ls1, y0, y1) in rows
+    ]
+
+def top_contact_trends(conn, state: Optional[str], limit: int = 3) -> List[Dict[str, Any]]:
+    """Return the top contact-method trends for the default last-5-year window."""
+    sql = """
+      SELECT contact_method, pct_change, losses_start, losses_end, year_start, year_end
+      FROM scam_contact_trends
+      WHERE state = %s
+      ORDER BY pct_change DESC
+      LIMIT %s;
+    """
+    with conn.cursor() as cur:
+        cur.execute(sql, [state or ALL_STATES, limit])
+        return _rows_to_trends(cur.fetchall())
+
+def contact_trends_for_span(conn, state: Optional[str],
+                            year_from: Optional[int], year_to: Optional[int],
+                            limit: int = 3) -> List[Dict[str, Any]]:
+    """
+    Return the top contact-method trends between year_from and year_to.
+    Either bound may be None, meaning the window is open on that side.
+    """
+    sql = """
+      WITH windowed AS (
+        SELECT contact_method, year, losses::float AS losses
+        FROM scam_contact_yearly
+        WHERE state = %(state)s
+          AND (%(y0)s::int IS NULL OR year >= %(y0)s)
+          AND (%(y1)s::int IS NULL OR year <= %(y1)s)
+      ),
+      span AS (
+        SELECT contact_method, MIN(year) AS y0, MAX(year) AS y1
+        FROM windowed
+        GROUP BY contact_method
+      )
+      SELECT
+        s.contact_method,
+        COALESCE(
+          CASE WHEN b0.losses IS NULL OR b0.losses = 0 THEN NULL
+               ELSE (b1.losses - b0.losses) / b0.losses * 100.0
+          END, 0.0
+        ) AS pct_change,
+        COALESCE(b0.losses, 0.0) AS losses_start,
+        COALESCE(b1.losses, 0.0) AS losses_end,
+        s.y0, s.y1
+      FROM span s
+      LEFT JOIN windowed b0 ON b0.contact_method = s.contact_method AND b0.year = s.y0
+      LEFT JOIN windowed b1 ON b1.contact_method = s.contact_method AND b1.year = s.y1
+      ORDER BY pct_change DESC NULLS LAST
+      LIMIT %(limit)s;
+    """
+    params = {"state": state or ALL_STATES, "y0": year_from, "y1": year_to, "limit": limit}
+    with conn.cursor() as cur:
+        cur.execute(sql, params)
+        return _rows_to_trends(cur.fetchall())
@@ -0,0 +1,85 @@
+# app/services/warmer.py
+# Post-refresh cache warmer for /stats.
+# Precomputes the payloads for high-value filter combinations
+# (every state x {default window, each of the last 5 years}, plus the
+# most requested scam types from the access log) and stores them as
+# pre-serialised JSON in STATS_SNAPSHOT for the current data version.
+
+import os
+import re
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+from urllib.parse import urlsplit, parse_qs
+from app.services.db import get_conn
+from app.services.filters import STATE_MAP, map_scam_type, get_year_bounds
+from app.services.stats import stats_key, compute_stats
+from app.services.cache import data_version, save_snapshot, stats_cache
+from app.services.responses import EncodedJSON
+
+WARM_WORKERS         = int(os.getenv("WARM_WORKERS", "4"))
+WARM_TOP_SCAM_TYPES  = int(os.getenv("WARM_TOP_SCAM_TYPES", "5"))
+ACCESS_LOG_PATH      = os.getenv("ACCESS_LOG_PATH")
+
+# Matches request lines such as: "GET /stats?year=2024&scam_type=Phishing HTTP/1.1"
+_STATS_REQUEST_RE = re.compile(r'"GET (/stats\?[^ "]+)')
+
+def top_requested_scam_types(path: Optional[str], n: int) -> List[str]:
+    """Return the n most requested scam types found in an access log."""
+    if not path or n <= 0 or not os.path.isfile(path):
+        return []
+    counts: Counter = Counter()
+    with open(path, encoding="utf-8", errors="replace") as f:
+        for line in f:
+            m = _STATS_REQUEST_RE.search(line)
+            if not m:
+                continue
+            query = parse_qs(urlsplit(m.group(1)).query)
+            for value in query.get("scam_type", []):
+                st = map_scam_type(value)
+                if st:
+                    counts[st] += 1
+    return [st for st, _ in counts.most_common(n)]
+
+def warm_keys(last5: List[int], scam_types: List[str]) -> List[tuple]:
+    """Enumerate the normalised /stats keys worth precomputing."""
+    years = [None] + list(last5)
+    states = [None] + list(STATE_MAP)
+    keys = [
+        stats_key(y, s, None, None, None, None, None)
+        for s in states for y in years
+    ]
+    keys += [stats_key(None, None, None, st, None, None, None) for st in scam_types]
+    # Preserve order, drop duplicates
+    return list(dict.fromkeys(keys))
+
+def warm_stats_cache(workers: int = WARM_WORKERS) -> int:
+    """Precompute /stats payloads for the current data version. Returns the count."""
+    # Read from the primary: replicas may still be replaying the refresh
+    version = data_version(max_age=0, readonly=False)
+    with get_conn() as conn:
+        _, last5 = get_year_bounds(conn)
+    keys = warm_keys(last5, top_requested_scam_types(ACCESS_LOG_PATH, WARM_TOP_SCAM_TYPES))
+
+    def _warm_one(key: tuple):
+        # Store under the version the payload was computed at
+        key_version, payload = compute_stats(*key, readonly=False)
+        body = EncodedJSON.from_payload(payload)
+        with get_conn() as conn:
+            save_snapshot(conn, key_version, key, body)
+            conn.commit()
+        stats_cache.put(key, body, key_version)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        list(pool.map(_warm_one, keys))
+
+    # Snapshots from previous data versions can never be served again
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute("DELETE FROM stats_snapshot WHERE data_version < %s;", [version])
+        conn.commit()
+
+    return len(keys)
+
+if __name__ == "__main__":
+    n = warm_stats_cache()
+    print(f"Warmed {n} /stats snapshots.")
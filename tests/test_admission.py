@@ -0,0 +1,40 @@
+# tests/test_admission.py
+# Unit tests for admission-control limit parsing and route matching.
+
+import asyncio
+from app.services import admission
+from app.services.admission import Limiter, parse_limits
+
+def test_parse_limits():
+    assert parse_limits(" /stats=8:32 , /stats/export=2:4,,/detect=3") == {
+        "/stats": (8, 32),
+        "/stats/export": (2, 4),
+        "/detect": (3, 0),
+    }
+
+def test_parse_limits_empty():
+    assert parse_limits("") == {}
+
+def test_match_prefers_longest_prefix_on_segment_boundary(monkeypatch):
+    limiters = {p: Limiter(p, 1, 1) for p in ("/stats", "/stats/export", "/filters")}
+    monkeypatch.setattr(admission, "LIMITERS", limiters)
+
+    assert admission._match("/stats") == "/stats"
+    assert admission._match("/stats/top") == "/stats"
+    assert admission._match("/stats/export") == "/stats/export"
+    assert admission._match("/stats/export/x") == "/stats/export"
+    assert admission._match("/statsfoo") is None
+    assert admission._match("/healthz") is None
+
+def test_limiter_rejects_when_queue_full():
+    async def run():
+        lim = Limiter("t", max_concurrent=1, max_queue=0)
+        assert await lim.acquire(timeout=0.1)
+        assert not await lim.acquire(timeout=0.1)
+        lim.release()
+        assert await lim.acquire(timeout=0.1)
+        return lim.stats()
+
+    stats = asyncio.run(run())
+    assert stats["admitted"] == 2
+    assert stats["rejected"] == 1
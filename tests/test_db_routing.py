@@ -0,0 +1,104 @@
+# tests/test_db_routing.py
+# Unit tests for read-replica selection and failover in get_conn.
+# Targets are real _Target objects with a fake checkout(), so no
+# database is needed.
+
+import itertools
+from contextlib import contextmanager
+import pytest
+
+psycopg2 = pytest.importorskip("psycopg2")
+pytest.importorskip("dotenv")
+
+from psycopg2.pool import PoolError
+from app.services import db
+
+def _target(name, replica=True, latency_ms=0.0, healthy=True, fail=None):
+    """A target whose checkout yields its own name, or raises fail."""
+    t = db._Target(name, "postgresql://unused", replica=replica)
+    t.latency_ms = latency_ms
+    t.healthy = healthy
+
+    @contextmanager
+    def checkout(timeout=None):
+        if fail is not None:
+            raise fail
+        yield name
+
+    t.checkout = checkout
+    return t
+
+@pytest.fixture
+def install(monkeypatch):
+    """Replace the module's targets; returns a function taking (replicas, strategy)."""
+    def _install(replicas, strategy="round_robin", primary=None):
+        primary = primary or _target("primary", replica=False)
+        monkeypatch.setattr(db, "_primary", primary)
+        monkeypatch.setattr(db, "_replicas", replicas)
+        monkeypatch.setattr(db, "_rr", itertools.count())
+        monkeypatch.setattr(db, "DB_REPLICA_STRATEGY", strategy)
+        monkeypatch.setattr(db, "_ensure_health_checks", lambda: None)
+        return primary
+    return _install
+
+def _names(targets):
+    return [t.name for t in targets]
+
+def test_round_robin_rotates_replicas_primary_last(install):
+    install([_target("a"), _target("b"), _target("c")])
+    assert _names(db._read_targets()) == ["a", "b", "c", "primary"]
+    assert _names(db._read_targets()) == ["b", "c", "a", "primary"]
+    assert _names(db._read_targets()) == ["c", "a", "b", "primary"]
+
+def test_least_latency_orders_by_latency(install):
+    install([_target("a", latency_ms=30), _target("b", latency_ms=10), _target("c", latency_ms=20)],
+            strategy="least_latency")
+    assert _names(db._read_targets()) == ["b", "c", "a", "primary"]
+
+def test_unhealthy_replicas_are_skipped(install):
+    install([_target("a"), _target("b", healthy=False), _target("c")])
+    assert _names(db._read_targets()) == ["a", "c", "primary"]
+
+def test_only_primary_when_no_replica_is_healthy(install):
+    install([_target("a", healthy=False)])
+    assert _names(db._read_targets()) == ["primary"]
+
+def test_readonly_uses_first_replica(install):
+    install([_target("a", latency_ms=1), _target("b", latency_ms=2)], strategy="least_latency")
+    with db.get_conn(readonly=True) as conn:
+        assert conn == "a"
+
+def test_writes_always_use_primary(install):
+    install([_target("a")])
+    with db.get_conn() as conn:
+        assert conn == "primary"
+
+def test_operational_error_fails_over_and_marks_unhealthy(install):
+    a = _target("a", latency_ms=1, fail=psycopg2.OperationalError("down"))
+    b = _target("b", latency_ms=2)
+    install([a, b], strategy="least_latency")
+    with db.get_conn(readonly=True) as conn:
+        assert conn == "b"
+    assert a.healthy is False
+    assert b.healthy is True
+
+def test_pool_error_fails_over_without_marking_unhealthy(install):
+    a = _target("a", latency_ms=1, fail=PoolError("saturated"))
+    b = _target("b", latency_ms=2)
+    install([a, b], strategy="least_latency")
+    with db.get_conn(readonly=True) as conn:
+        assert conn == "b"
+    assert a.healthy is True
+
+def test_falls_back_to_primary_when_all_replicas_fail(install):
+    install([_target("a", fail=psycopg2.OperationalError("down")),
+             _target("b", fail=PoolError("saturated"))])
+    with db.get_conn(readonly=True) as conn:
+        assert conn == "primary"
+
+def test_primary_failure_is_raised(install):
+    install([_target("a", fail=psycopg2.OperationalError("down"))],
+            primary=_target("primary", replica=False, fail=PoolError("saturated")))
+    with pytest.raises(PoolError):
+        with db.get_conn(readonly=True):
+            pass
@@ -0,0 +1,34 @@
+# tests/test_partitions.py
+# Unit tests for narrowing partition counter changes to rollup years.
+
+import pytest
+
+pytest.importorskip("psycopg2")
+pytest.importorskip("dotenv")
+
+from app.services.partitions import changed_years
+
+BEFORE = {"scam_data_raw_default": 5, "scam_data_raw_y2023": 100, "scam_data_raw_y2024": 40}
+
+def test_unchanged_counters():
+    assert changed_years(BEFORE, dict(BEFORE)) == []
+
+def test_written_partitions():
+    after = dict(BEFORE, scam_data_raw_y2024=60)
+    assert changed_years(BEFORE, after) == [2024]
+
+def test_created_and_detached_partitions():
+    after = dict(BEFORE, scam_data_raw_y2025=10)
+    del after["scam_data_raw_y2023"]
+    assert changed_years(BEFORE, after) == [2023, 2025]
+
+def test_full_rebuild_without_previous_snapshot():
+    assert changed_years(None, BEFORE) is None
+
+def test_full_rebuild_when_default_partition_changed():
+    after = dict(BEFORE, scam_data_raw_default=6, scam_data_raw_y2024=60)
+    assert changed_years(BEFORE, after) is None
+
+def test_full_rebuild_when_counters_reset():
+    after = dict(BEFORE, scam_data_raw_y2023=0)
+    assert changed_years(BEFORE, after) is None
@@ -0,0 +1,21 @@
+# tests/test_responses.py
+# Unit tests for Accept-Encoding negotiation.
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("psycopg2")
+
+from app.services.responses import _accepted
+
+def test_accepted_parses_codings_and_q_values():
+    assert _accepted("gzip, br;q=0.5, identity;q=0") == {"gzip": 1.0, "br": 0.5, "identity": 0.0}
+
+def test_accepted_is_case_insensitive_and_skips_empty_parts():
+    assert _accepted("GZip,, BR ;q=1") == {"gzip": 1.0, "br": 1.0}
+
+def test_accepted_treats_bad_q_as_zero():
+    assert _accepted("br;q=high") == {"br": 0.0}
+
+def test_accepted_empty_header():
+    assert _accepted("") == {}
@@ -0,0 +1,126 @@
+# tests/test_singleflight.py
+# Unit tests for request coalescing (sync and async callers).
+
+import time
+import asyncio
+import threading
+import pytest
+from app.services.singleflight import SingleFlight
+
+def _wait_for(cond, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not cond():
+        if time.monotonic() > deadline:
+            raise AssertionError("condition not reached")
+        time.sleep(0.001)
+
+def test_do_shares_one_execution():
+    flight = SingleFlight("test-do")
+    gate = threading.Event()
+    calls = []
+
+    def work():
+        calls.append(1)
+        gate.wait(2)
+        return "value"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flight.do("k", work))) for _ in range(5)]
+    for t in threads:
+        t.start()
+    _wait_for(lambda: flight.merged == 4)
+    gate.set()
+    for t in threads:
+        t.join()
+
+    assert results == ["value"] * 5
+    assert len(calls) == 1
+    assert flight.stats() == {"executed": 1, "merged": 4, "in_flight": 0}
+
+def test_do_propagates_errors_to_waiters():
+    flight = SingleFlight("test-do-error")
+    gate = threading.Event()
+
+    def work():
+        gate.wait(2)
+        raise ValueError("boom")
+
+    errors = []
+    def call():
+        try:
+            flight.do("k", work)
+        except ValueError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(3)]
+    for t in threads:
+        t.start()
+    _wait_for(lambda: flight.merged == 2)
+    gate.set()
+    for t in threads:
+        t.join()
+
+    assert len(errors) == 3
+    # The next call runs again instead of reusing the failure
+    assert flight.do("k", lambda: "ok") == "ok"
+
+def test_do_async_shares_one_execution():
+    flight = SingleFlight("test-do-async")
+    calls = []
+
+    async def run():
+        gate = asyncio.Event()
+
+        async def work():
+            calls.append(1)
+            await gate.wait()
+            return "value"
+
+        tasks = [asyncio.create_task(flight.do_async("k", work)) for _ in range(5)]
+        await asyncio.sleep(0)
+        gate.set()
+        return await asyncio.gather(*tasks)
+
+    assert asyncio.run(run()) == ["value"] * 5
+    assert len(calls) == 1
+    assert flight.stats() == {"executed": 1, "merged": 4, "in_flight": 0}
+
+def test_do_async_propagates_errors():
+    flight = SingleFlight("test-do-async-error")
+
+    async def run():
+        gate = asyncio.Event()
+
+        async def work():
+            await gate.wait()
+            raise ValueError("boom")
+
+        tasks = [asyncio.create_task(flight.do_async("k", work)) for _ in range(3)]
+        await asyncio.sleep(0)
+        gate.set()
+        return await asyncio.gather(*tasks, return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert all(isinstance(r, ValueError) for r in results)
+
+def test_do_async_cancelled_waiter_does_not_cancel_leader():
+    flight = SingleFlight("test-do-async-cancel")
+
+    async def run():
+        gate = asyncio.Event()
+
+        async def work():
+            await gate.wait()
+            return "value"
+
+        leader = asyncio.create_task(flight.do_async("k", work))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(flight.do_async("k", work))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        gate.set()
+        return await leader
+
+    assert asyncio.run(run()) == "value"
@@ -0,0 +1,46 @@
+# tests/test_stats_routes.py
+# Unit tests for /stats/top cursor handling and rollup selection.
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("psycopg2")
+
+from fastapi import HTTPException
+from app.routes.stats import _encode_cursor, _decode_cursor, _pick_source
+
+NO_FILTERS = {"state": None, "category": None, "scam_type": None,
+              "contact_method": None, "age_group": None, "gender": None}
+
+def test_cursor_round_trip():
+    cursor = _encode_cursor([123.5, "Phishing"], 20)
+    assert _decode_cursor(cursor, 2) == ([123.5, "Phishing"], 20)
+
+def test_cursor_rejects_garbage():
+    with pytest.raises(HTTPException) as e:
+        _decode_cursor("not-a-cursor", 2)
+    assert e.value.status_code == 400
+
+def test_cursor_rejects_width_mismatch():
+    with pytest.raises(HTTPException) as e:
+        _decode_cursor(_encode_cursor([1, "a"], 5), 3)
+    assert e.value.status_code == 400
+
+def test_pick_source_by_state_keeps_null_states():
+    table, extra = _pick_source(["state", "year"], NO_FILTERS)
+    assert table == "scam_contact_yearly"
+    assert extra == ["state IS DISTINCT FROM 'ALL'"]
+
+def test_pick_source_uses_all_row_without_state():
+    table, extra = _pick_source(["contact_method"], NO_FILTERS)
+    assert table == "scam_contact_yearly"
+    assert extra == ["state = 'ALL'"]
+
+def test_pick_source_state_filter():
+    filters = dict(NO_FILTERS, state="New South Wales")
+    assert _pick_source(["contact_method"], filters) == ("scam_contact_yearly", [])
+
+def test_pick_source_falls_back_to_scam_stats():
+    assert _pick_source(["category"], NO_FILTERS) == ("scam_stats", [])
+    filters = dict(NO_FILTERS, scam_type="Phishing")
+    assert _pick_source(["contact_method"], filters) == ("scam_stats", [])